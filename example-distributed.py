@@ -0,0 +1,43 @@
+import sys
+from judge import Mars, ISim, MarsJudge, resolve_paths, INFINITE_LOOP
+from judge.distributed import Coordinator, Worker
+
+# python example-distributed.py coordinator
+# python example-distributed.py worker 192.168.1.10
+project_path = 'ise-projects/mips5'
+module_name = 'tb'
+
+cases = [
+    'cases/5',
+    'cases/extra',
+]
+
+host = '0.0.0.0'
+port = 24680
+lease = 120
+db = True
+duration = 'all'
+appendix = INFINITE_LOOP
+timeout = 3
+
+
+def coordinator():
+    c = Coordinator(resolve_paths(cases), host=host, port=port, lease=lease)
+    results = c.serve()
+    failed = [r for r in results if r['verdict'] not in ('ok', 'permitted')]
+    print('{}/{} passed'.format(len(results) - len(failed), len(results)))
+
+
+def worker(coordinator_host):
+    isim = ISim(project_path, module_name, duration=duration,
+                appendix=appendix, recompile=True, timeout=timeout)
+    mars = Mars(db=db, timeout=timeout)
+    judge = MarsJudge(isim, mars)
+    Worker(judge, coordinator_host, port).run()
+
+
+if __name__ == '__main__':
+    if sys.argv[1] == 'coordinator':
+        coordinator()
+    else:
+        worker(sys.argv[2])
@@ -1,7 +1,8 @@
-import argparse
-from judge.isim import duration_default
-from judge.base import timeout_default
-from judge import ISim, Mars, Diff, MarsJudge, INFINITE_LOOP, resolve_paths
+import sys, argparse
+from judge.defaults import duration_default, timeout_default, INFINITE_LOOP, store_dir_default, answers_dir_default, \
+    staging_root_default
+from judge.schedule import History, policies, history_fn_default, parse_shard
+from judge.journal import journal_fn_default
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Verify MIPS CPU in Verilog against MARS simulation of given .asm '
@@ -38,14 +39,152 @@ if __name__ == '__main__':
     parser.add_argument('--mars-timeout', metavar='secs', type=int,
                         default=None,
                         help='timeout for MARS simulation, {} by default'.format(timeout_default))
+    parser.add_argument('--session', action='store_true',
+                        help='keep one ISim simulator open and rerun the test bench with restart for each case')
+    parser.add_argument('--mars-server', action='store_true',
+                        help='keep one MARS JVM running for all the cases instead of launching one per call')
+    parser.add_argument('--fast-jvm', action='store_true',
+                        help='launch java with start-up flags and a class data sharing archive where supported')
+    parser.add_argument('--staging', metavar='path', nargs='?',
+                        default=None, const=staging_root_default,
+                        help='stage intermediate files under this path (a tmpfs), keeping only failures in tmp, '
+                             '"{}" if no path is given'.format(staging_root_default))
+    parser.add_argument('--retention-days', metavar='days', type=float,
+                        default=None,
+                        help='remove judge directories in tmp older than this')
+    parser.add_argument('--retention-bytes', metavar='bytes', type=int,
+                        default=None,
+                        help='then remove the oldest judge directories in tmp until they take at most this')
+    parser.add_argument('--reference', action='store_true',
+                        help='produce the answers with the built-in MIPS simulator, using MARS only to assemble')
+    parser.add_argument('--cross-check', action='store_true',
+                        help='with --reference, also run MARS and fail on any disagreement')
+    parser.add_argument('--store', metavar='path', nargs='?',
+                        default=None, const=store_dir_default,
+                        help='keep failed traces compressed and deduplicated in this store, with a summary of the '
+                             'first mismatch, "{}" if no path is given'.format(store_dir_default))
+    parser.add_argument('--compact', action='store_true',
+                        help='compare compact binary traces, rendering text only for mismatches')
+    parser.add_argument('--order', choices=['glob'] + list(policies),
+                        default=None,
+                        help='order to judge the cases in, based on verdicts and timings in the history file')
+    parser.add_argument('--shard', metavar='i/n', type=parse_shard,
+                        default=None,
+                        help='only judge the i-th of n shards of the cases (from 1), balanced by the timings in '
+                             'the history file, so that CI nodes sharing it finish at about the same time')
+    parser.add_argument('--history', metavar='path',
+                        default=None,
+                        help='file to record verdicts and timings in, "{}" by default when --order is given'
+                        .format(history_fn_default))
+    parser.add_argument('--answers', metavar='path', nargs='?',
+                        default=None, const=answers_dir_default,
+                        help='keep the MARS answers in this directory by the hash of the case for later runs to '
+                             'reuse, "{}" if no path is given'.format(answers_dir_default))
+    parser.add_argument('--journal', metavar='path', nargs='?',
+                        default=None, const=journal_fn_default,
+                        help='record verdicts in this progress journal as the cases finish, "{}" if no path is '
+                             'given'.format(journal_fn_default))
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the journal, skipping the cases it records as done, unless the judge '
+                             'configuration changed')
+    parser.add_argument('--progress', choices=['text', 'json'], nargs='?',
+                        default=None, const='text',
+                        help='report throughput, ETA, the cases in flight and a tally of verdicts every few secs, '
+                             'as text or as JSON lines')
+    parser.add_argument('--progress-file', metavar='path',
+                        default=None,
+                        help='write the progress to this file instead of stderr')
+    parser.add_argument('--client', action='store_true',
+                        help='submit the job to a judge daemon started by "python -m judge.daemon" instead')
+    parser.add_argument('--socket', metavar='path',
+                        default=None,
+                        help='path to the unix socket of the judge daemon')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and rejudge when the sources or the cases change, failed cases first')
 
     args = parser.parse_args()
+    if args.client:
+        # the daemon keeps judges of its own, with none of these
+        local = [flag for flag, value in (('--reference', args.reference), ('--cross-check', args.cross_check),
+                                          ('--answers', args.answers), ('--staging', args.staging),
+                                          ('--retention-days', args.retention_days),
+                                          ('--retention-bytes', args.retention_bytes), ('--watch', args.watch))
+                 if value is not None and value is not False]
+        if local:
+            parser.error('{} cannot be used with --client'.format(', '.join(local)))
+
+    isim_kw = dict(project_path=args.project_path, module_name=args.module_name, duration=args.duration,
+                   appendix=None if args.no_infinite_loop_appendix else INFINITE_LOOP,
+                   recompile=args.recompile, timeout=args.tb_timeout, ise_path=args.ise_path,
+                   session=args.session)
+    mars_kw = dict(mars_path=args.mars_path, java_path=args.java_path, db=args.db, timeout=args.mars_timeout,
+                   jvm=args.fast_jvm, server=args.mars_server)
+    diff_kw = dict(diff_path=args.diff_path, compact=args.compact, store=args.store)
+    progress = args.progress and dict(mode=args.progress, file=args.progress_file)
+
+    if args.client:
+        from judge.daemon import submit
+        from judge.utils import resolve_paths, shard
+        all_kw = dict(order=args.order, history=args.history or (args.order and history_fn_default),
+                      journal=args.journal, resume=args.resume, progress=progress)
+        cases = args.asm_path
+        if args.shard:
+            with History(args.history or history_fn_default) as history:
+                cases = shard(resolve_paths(cases), *args.shard, history)
+        sys.exit(0 if submit(args.socket, 'isim', isim_kw, mars_kw, diff_kw, cases, all_kw) else 1)
+
+    from judge import ISim, Mars, Diff, MarsJudge, resolve_paths
+    from judge.jvm import report_launches
+    from judge.utils import shard
+    from judge.watch import watch
+
+    isim = ISim(**isim_kw)
+    mars = Mars(**mars_kw)
+    diff = Diff(**diff_kw)
 
-    isim = ISim(args.project_path, args.module_name, duration=args.duration,
-                appendix=None if args.no_infinite_loop_appendix else INFINITE_LOOP,
-                recompile=args.recompile, timeout=args.tb_timeout)
-    mars = Mars(args.mars_path, java_path=args.java_path, db=args.db, timeout=args.mars_timeout)
-    diff = Diff(args.diff_path)
+    staging = None
+    retention = dict(max_age=None if args.retention_days is None else args.retention_days * 86400,
+                     max_bytes=args.retention_bytes)
+    if args.staging:
+        from judge.staging import Staging
+        staging = Staging(args.staging, **retention)
+    else:
+        from judge.staging import retain
+        retain(**retention)
+    cache = None
+    if args.answers:
+        from judge.cache import AnswerCache
+        cache = AnswerCache(args.answers)
+        cache.prune(**retention)
 
-    judge = MarsJudge(isim, mars, diff)
-    judge.all(resolve_paths(args.asm_path))
+    judge = MarsJudge(isim, mars, diff, cache=cache, staging=staging)
+    if args.reference:
+        from judge.sim import Simulator
+        judge.set_reference(Simulator(), args.cross_check)
+    if args.watch:
+        def on_change(_):
+            isim.recompile = True
+        watch_args = (judge, args.asm_path, args.project_path, ('*.v', '*.prj'), on_change)
+        watch_kw = dict(order=args.order, journal=args.journal, resume=args.resume, progress=progress)
+        if args.order or args.history:
+            with History(args.history or history_fn_default) as history:
+                watch(*watch_args, history=history, **watch_kw)
+        else:
+            watch(*watch_args, **watch_kw)
+    elif args.order or args.history or args.shard:
+        with History(args.history or history_fn_default) as history:
+            paths = resolve_paths(args.asm_path)
+            if args.shard:
+                paths = shard(paths, *args.shard, history)
+            judge.all(paths, order=args.order, history=history, journal=args.journal, resume=args.resume,
+                      progress=progress)
+    else:
+        judge.all(resolve_paths(args.asm_path), journal=args.journal, resume=args.resume, progress=progress)
+    report_launches(mars)
+    if mars.server:
+        mars.server.report()
+    if diff.store:
+        diff.store.report()
+    if isim.session:
+        isim.session.report()
+        isim.session.close()
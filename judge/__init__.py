@@ -1,11 +1,33 @@
-from .base import VerificationFailed, INFINITE_LOOP, DISABLE_SR
-from .isim import ISim
-from .mars import Mars
-from .diff import Diff
-from .judge import MarsJudge, DuetJudge, DummyJudge
-from .utils import resolve_paths
-
-try:
-    from .logisim import Logisim
-except Exception:
-    pass
+import importlib
+
+# submodules are only imported on first access, so that a bare `import judge` stays cheap
+_exports = {
+    'VerificationFailed': 'base',
+    'INFINITE_LOOP': 'base',
+    'DISABLE_SR': 'base',
+    'ISim': 'isim',
+    'Icarus': 'icarus',
+    'Mars': 'mars',
+    'Diff': 'diff',
+    'MarsJudge': 'judge',
+    'DuetJudge': 'judge',
+    'DummyJudge': 'judge',
+    'FanOutJudge': 'judge',
+    'resolve_paths': 'utils',
+    'Logisim': 'logisim',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    mod = _exports.get(name)
+    if mod is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module('.' + mod, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
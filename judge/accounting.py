@@ -0,0 +1,108 @@
+import os, sys, subprocess, threading
+
+outlier_factor = 3.0  # times the median of a runner over the cases
+outlier_min_cpu = 0.5  # secs, below which no case is worth flagging
+outlier_min_rss = 64 << 10  # KiB above the median
+
+
+class Usage:
+    def __init__(self, wall=0., user=0., system=0., maxrss=0, output=0, n=0):
+        self.wall = wall
+        self.user = user
+        self.system = system
+        self.maxrss = maxrss  # KiB
+        self.output = output  # bytes
+        self.n = n
+
+    @property
+    def cpu(self):
+        return self.user + self.system
+
+    def add(self, other):
+        self.wall += other.wall
+        self.user += other.user
+        self.system += other.system
+        self.maxrss = max(self.maxrss, other.maxrss)
+        self.output += other.output
+        self.n += other.n
+        return self
+
+    def __str__(self):
+        return '{} runs, wall {:.2f}s, user {:.2f}s, sys {:.2f}s, peak RSS {:.1f} MiB, output {:.1f} KiB'.format(
+            self.n, self.wall, self.user, self.system, self.maxrss / 1024, self.output / 1024)
+
+
+# ru_maxrss is in KiB on Linux but in bytes on macOS
+def rusage_usage(ru, wall, output):
+    maxrss = ru.ru_maxrss // 1024 if sys.platform == 'darwin' else ru.ru_maxrss
+    return Usage(wall, ru.ru_utime, ru.ru_stime, maxrss, output, 1)
+
+
+# reaps the child with os.wait4, keeping its resource usage in rusage
+class AccountedPopen(subprocess.Popen):
+    rusage = None
+
+    if hasattr(os, 'wait4'):
+        def _try_wait(self, wait_flags):
+            try:
+                pid, sts, ru = os.wait4(self.pid, wait_flags)
+            except ChildProcessError:
+                return self.pid, 0
+            if pid == self.pid:
+                self.rusage = ru
+            return pid, sts
+
+
+class Accounting:
+    def __init__(self):
+        self.records = []
+        self.mutex = threading.Lock()
+
+    def record(self, usage):
+        with self.mutex:
+            self.records.append(usage)
+
+    def mark(self):
+        with self.mutex:
+            return len(self.records)
+
+    def since(self, mark=0):
+        r = Usage()
+        with self.mutex:
+            for usage in self.records[mark:]:
+                r.add(usage)
+        return r
+
+    def total(self):
+        return self.since(0)
+
+
+def _median(xs):
+    xs = sorted(xs)
+    n = len(xs)
+    return (xs[n // 2] + xs[(n - 1) // 2]) / 2 if n else 0.
+
+
+# cases with a CPU time or a peak RSS far above the median of the same runner
+def outliers(cases, factor=outlier_factor):
+    r = []
+    names = {name for usages in cases.values() for name in usages}
+    for name in sorted(names):
+        per_case = {path: usages[name] for path, usages in cases.items() if name in usages}
+        cpu = _median(u.cpu for u in per_case.values())
+        rss = _median(u.maxrss for u in per_case.values())
+        for path, u in per_case.items():
+            if u.cpu > max(cpu * factor, outlier_min_cpu):
+                r.append((path, name, 'CPU {:.2f}s, {:.1f}x the median'.format(u.cpu, u.cpu / cpu if cpu else 0)))
+            if u.maxrss > max(rss * factor, rss + outlier_min_rss):
+                r.append((path, name, 'peak RSS {:.1f} MiB, {:.1f}x the median'.format(
+                    u.maxrss / 1024, u.maxrss / rss if rss else 0)))
+    return r
+
+
+def report(runners, cases, file=sys.stdout):
+    for name, usage in runners.items():
+        if usage.n:
+            print('{}: {}'.format(name, usage), file=file)
+    for path, name, msg in outliers(cases):
+        print('Outlier: {} on {}: {}'.format(name, path, msg), file=file)
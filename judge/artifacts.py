@@ -0,0 +1,188 @@
+import os, sys, json, gzip, lzma, time, hashlib, itertools, threading
+from collections import deque
+
+from .trace import Trace, first_mismatch
+from .utils import TmpDir
+from .defaults import store_dir_default
+
+context_default = 5
+chunk_size = 1 << 16
+
+codecs = {
+    'gzip': ('.gz', gzip.open),
+    'lzma': ('.xz', lzma.open),
+}
+
+
+def _iter_chunks(src):
+    if isinstance(src, Trace):
+        for line in src.lines():
+            yield (line + '\n').encode()
+    else:
+        with open(src, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(chunk_size), b''):
+                yield chunk
+
+
+def _iter_lines(src):
+    if isinstance(src, Trace):
+        return src.lines()
+    return _text_lines(src)
+
+
+def _text_lines(path):
+    with open(path, encoding='utf-8', errors='ignore') as fp:
+        for line in fp:
+            yield line.rstrip('\r\n')
+
+
+# the first differing line of two line streams, with up to context lines before and after it on both sides
+def divergence(out_lines, ans_lines, context=context_default, permit_prefix=False):
+    before = deque(maxlen=context)
+    out_lines, ans_lines = iter(out_lines), iter(ans_lines)
+    i = 0
+    for o, a in itertools.zip_longest(out_lines, ans_lines):
+        if o != a:
+            if permit_prefix and (o is None or a is None):
+                return None
+            out_after = [o] if o is not None else []
+            ans_after = [a] if a is not None else []
+            out_after += itertools.islice(out_lines, context)
+            ans_after += itertools.islice(ans_lines, context)
+            return i, list(before), out_after, ans_after
+        before.append(o)
+        i += 1
+    return None
+
+
+# failure traces, compressed and stored once per content, with a summary of the context around each divergence
+class ArtifactStore:
+    def __init__(self, path=store_dir_default, codec='gzip', context=context_default):
+        if codec not in codecs:
+            raise ValueError('unknown codec {}, expected one of {}'.format(codec, ', '.join(codecs)))
+        self.root = TmpDir(path)
+        self.codec = codec
+        self.context = context
+        self.mutex = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+
+    def blob_path(self, digest, codec=None):
+        ext = codecs[self.codec if codec is None else codec][0]
+        return os.path.join(self.root(), 'objects', digest[:2], digest + ext)
+
+    def find(self, digest):
+        for codec in codecs:
+            path = self.blob_path(digest, codec)
+            if os.path.isfile(path):
+                return path, codec
+        raise FileNotFoundError('no stored trace ' + digest)
+
+    # compress a text file or a Trace into the store, returning its content hash; the content is hashed
+    # first, as hashing is much cheaper than compressing a trace that is already stored
+    def put(self, src):
+        h = hashlib.sha256()
+        for chunk in _iter_chunks(src):
+            h.update(chunk)
+        digest = h.hexdigest()
+        try:
+            self.find(digest)
+        except FileNotFoundError:
+            pass
+        else:
+            with self.mutex:
+                self.deduplicated += 1
+            return digest
+
+        tmp = os.path.join(self.root(), '{}-{}.tmp'.format(os.getpid(), threading.get_ident()))
+        with codecs[self.codec][1](tmp, 'wb') as fp:
+            for chunk in _iter_chunks(src):
+                fp.write(chunk)
+        with self.mutex:
+            try:
+                self.find(digest)
+            except FileNotFoundError:
+                path = self.blob_path(digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp, path)
+                self.stored += 1
+                return digest
+            self.deduplicated += 1
+        os.remove(tmp)
+        return digest
+
+    # stream a stored trace back line by line, by its hash or a unique prefix of it
+    def lines(self, digest):
+        if len(digest) < 64:
+            digest = self.resolve(digest)
+        path, codec = self.find(digest)
+        with codecs[codec][1](path, 'rt', encoding='utf-8') as fp:
+            for line in fp:
+                yield line.rstrip('\n')
+
+    def resolve(self, prefix):
+        d = os.path.join(self.root(), 'objects', prefix[:2])
+        names = [fn for fn in os.listdir(d) if fn.startswith(prefix)] if os.path.isdir(d) else []
+        if len(names) != 1:
+            raise FileNotFoundError('{} stored traces match {}'.format(len(names), prefix))
+        return names[0].split('.')[0]
+
+    def summarize(self, out, ans, permit_prefix=False):
+        if isinstance(out, Trace):
+            i = first_mismatch(out, ans, permit_prefix)
+            if i is None:
+                return None
+            start = max(i - self.context, 0)
+            return (i, list(out.lines(start, i)),
+                    list(out.lines(i, i + self.context + 1)), list(ans.lines(i, i + self.context + 1)))
+        return divergence(_iter_lines(out), _iter_lines(ans), self.context, permit_prefix)
+
+    # store both traces of a failed case, returning the path of the summary written for it
+    def record(self, name, out, ans, permit_prefix=False):
+        out_digest = self.put(out)
+        ans_digest = self.put(ans)
+        d = self.summarize(out, ans, permit_prefix)
+        summary_path = os.path.join(self.root(), '{}.{}.diff'.format(name, out_digest[:10]))
+        with open(summary_path, 'w', encoding='utf-8') as fp:
+            fp.write('out: {}\nans: {}\n'.format(out_digest, ans_digest))
+            if d is None:
+                fp.write('no differing line, the traces differ in whitespace only\n')
+            else:
+                i, before, out_after, ans_after = d
+                fp.write('first mismatch at line {}\n'.format(i + 1))
+                for line in before:
+                    fp.write('  {}\n'.format(line))
+                for mark, after in (('<', out_after), ('>', ans_after)):
+                    fp.write('---\n')
+                    for j, line in enumerate(after):
+                        fp.write('{} {}{}\n'.format(mark, line, '  <--' if j == 0 else ''))
+                    if not after:
+                        fp.write('{} (end of trace)  <--\n'.format(mark))
+        with self.mutex:
+            with open(os.path.join(self.root(), 'index.jsonl'), 'a', encoding='utf-8') as fp:
+                fp.write(json.dumps({'case': name, 'time': time.time(), 'out': out_digest, 'ans': ans_digest,
+                                     'line': None if d is None else d[0] + 1, 'summary': summary_path}) + '\n')
+        return summary_path
+
+    def report(self, file=sys.stdout):
+        print('Stored {} failure traces under {}, {} deduplicated'.format(
+            self.stored, self.root.path, self.deduplicated), file=file)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Stream a failure trace stored by the judge.')
+    parser.add_argument('digest', help='hash of the trace, or a unique prefix of it, as in the summaries')
+    parser.add_argument('--store', metavar='path', default=store_dir_default,
+                        help='the artifact store, "{}" by default'.format(store_dir_default))
+    args = parser.parse_args()
+    store = ArtifactStore(args.store)
+    try:
+        for line in store.lines(args.digest):
+            print(line)
+    except BrokenPipeError:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
-import os, subprocess
-from .utils import kill_im
+import os, select, subprocess, threading, time
+from contextlib import contextmanager
+from .accounting import AccountedPopen, Accounting, Usage, rusage_usage
+from .utils import kill_im, kill_group, set_limits, resource
+from .trace import parse_text
+from .defaults import timeout_default, INFINITE_LOOP
 
-timeout_default = 3
-
-INFINITE_LOOP = '1000ffff\n00000000\n'  # beq $0, $0, -1; nop;
 DISABLE_SR = '40806000\n'  # mtc0 $0
 
 
@@ -15,21 +16,43 @@ def render_msg(msg):
     return (', ' + msg) if msg else ''
 
 
-def _communicate_callback(proc, fp, handler, timeout=None, ctx=None, raw_output_file=None):
-    s = proc.communicate(timeout=timeout)[0]
+# feed the raw output of a run, line by line, through handler into a file or a Trace sink
+def handle_output(s, fp, handler, ctx=None, raw_output_file=None):
     if raw_output_file:
         with open(raw_output_file, 'wb') as raw:
             raw.write(s)
+    push = getattr(fp, 'push', None)
     for line in s.decode(errors='ignore').splitlines():
         r = handler(line.strip()) if ctx is None else handler(line.strip(), ctx)
-        if r and fp:
-            fp.write(r + '\n')
+        if r and fp is not None:
+            if push:
+                push(r)
+            else:
+                fp.write(r + '\n')
+
+
+# wait until the child prints something or exits, returning whether it did within timeout,
+# or None where pipes cannot be selected on (Windows)
+def _wait_output(proc, timeout=None):
+    try:
+        return bool(select.select([proc.stdout], [], [], timeout)[0])
+    except (OSError, ValueError):
+        return None
+
+
+def _communicate_callback(proc, fp, handler, timeout=None, ctx=None, raw_output_file=None):
+    s = proc.communicate(timeout=timeout)[0]
+    handle_output(s, fp, handler, ctx, raw_output_file)
+    return len(s)
 
 
 class BaseRunner:
+    launches = None  # LaunchStats of the time to the first output, for runners launching a JVM
+
     def __init__(self, timeout=None, env=None, cwd=None,
                  kill_on_timeout=True, permit_timeout=True,
-                 raw_output_file=None
+                 raw_output_file=None,
+                 limits=None
                  ):
         self.timeout = timeout_default if timeout is None else timeout
         self.env = env
@@ -37,43 +60,131 @@ class BaseRunner:
         self.permit_timeout = permit_timeout
         self.kill_on_timeout = kill_on_timeout
         self.raw_output_file = raw_output_file
-
-    @staticmethod
-    def stop():
-        pass
+        if limits and resource is None:
+            raise NotImplementedError('resource limits are only supported on POSIX')
+        self.limits = limits
+        self.procs = set()
+        self.procs_mutex = threading.Lock()
+        self.accounting = Accounting()
+        self.timeouts = 0  # permitted ones
+
+    def stop(self):
+        with self.procs_mutex:
+            procs = list(self.procs)
+        for proc in procs:
+            kill_group(proc)
+
+    def _popen(self, cmd):
+        kw = {}
+        if os.name != 'nt':
+            # own session, so that a timeout or stop() also takes down JVM or simulator grandchildren
+            kw['start_new_session'] = True
+            if self.limits:
+                # in the child before exec, so that nothing runs unlimited; setrlimit takes no locks
+                # that other threads could hold at fork
+                kw['preexec_fn'] = lambda: set_limits(self.limits)
+        try:
+            proc = AccountedPopen(cmd, stdout=subprocess.PIPE, cwd=self.cwd, env=self.env, **kw)
+        except RuntimeError:
+            # preexec_fn is unsupported in subinterpreters, limit the child right after it starts instead
+            if 'preexec_fn' not in kw or not hasattr(resource, 'prlimit'):
+                raise
+            del kw['preexec_fn']
+            proc = AccountedPopen(cmd, stdout=subprocess.PIPE, cwd=self.cwd, env=self.env, **kw)
+            try:
+                set_limits(self.limits, proc.pid)
+            except ProcessLookupError:
+                pass
+        with self.procs_mutex:
+            self.procs.add(proc)
+        return proc
+
+    # resource usage of a finished child, or wall time and output only where wait4 is unavailable
+    def account(self, proc, wall, output):
+        if proc.rusage is None:
+            self.accounting.record(Usage(wall, output=output, n=1))
+        else:
+            self.accounting.record(rusage_usage(proc.rusage, wall, output))
+
+    def _release(self, proc):
+        with self.procs_mutex:
+            self.procs.discard(proc)
 
     def parse(self, line):
         raise TypeError
 
+    # compact counterpart of parse, returning a (pc, kind, addr, data) record
+    def parse_record(self, line):
+        r = self.parse(line)
+        if r:
+            try:
+                return parse_text(r)
+            except ValueError as e:
+                raise VerificationFailed('invalid output ({}): {}'.format(e, r)) from e
+
+    def output_handler(self, fp):
+        return self.parse_record if hasattr(fp, 'push') else self.parse
+
+    def _timed_out(self, timeout_msg, e=None):
+        msg = '{} timed out after {} secs{}'.format(
+            self.__class__.__name__, self.timeout, render_msg(timeout_msg)
+        )
+        if self.permit_timeout:
+            self.timeouts += 1
+            print('Permitted:', msg)
+            return
+        raise RuntimeError(msg) from e
+
     def _communicate_fp(self, cmd, fp, timeout_msg, error_msg=None, ctx=None):
         name = self.__class__.__name__
-        with subprocess.Popen(cmd, stdout=subprocess.PIPE, cwd=self.cwd, env=self.env) as proc:
-            try:
-                _communicate_callback(proc, fp, self.parse, self.timeout, ctx=ctx,
-                                      raw_output_file=self.raw_output_file)
-            except subprocess.TimeoutExpired as e:
-                proc.kill()
-                if self.kill_on_timeout:
-                    kill_im(os.path.basename(cmd[0]))
-                _communicate_callback(proc, fp, self.parse, ctx=ctx,
-                                      raw_output_file=self.raw_output_file)
-                msg = '{} timed out after {} secs{}'.format(
-                    name, self.timeout, render_msg(timeout_msg)
-                )
-                if self.permit_timeout:
-                    print('Permitted:', msg)
-                    return
-                raise RuntimeError(msg) from e
+        handler = self.output_handler(fp)
+        start = time.perf_counter()
+        output = 0
+        proc = None
+        try:
+            with self._popen(cmd) as proc:
+                try:
+                    timeout = self.timeout
+                    if self.launches is not None:
+                        printed = _wait_output(proc, timeout)
+                        if printed:
+                            launched = time.perf_counter() - start
+                            self.launches.add(launched)
+                            timeout = max(timeout - launched, 0)
+                        elif printed is not None:
+                            raise subprocess.TimeoutExpired(cmd, timeout)  # silent until the deadline
+                    output = _communicate_callback(proc, fp, handler, timeout, ctx=ctx,
+                                                   raw_output_file=self.raw_output_file)
+                except subprocess.TimeoutExpired as e:
+                    kill_group(proc)
+                    if self.kill_on_timeout and os.name == 'nt':
+                        kill_im(os.path.basename(cmd[0]))
+                    output = _communicate_callback(proc, fp, handler, ctx=ctx,
+                                                   raw_output_file=self.raw_output_file)
+                    return self._timed_out(timeout_msg, e)
+                finally:
+                    self._release(proc)
+        finally:
+            if proc is not None:
+                self.account(proc, time.perf_counter() - start, output)
         if proc.returncode:
             raise RuntimeError('{} subprocess returned {}{}'.format(
                 name, proc.returncode, render_msg(error_msg)
             ))
 
-    def _communicate(self, cmd, out_fn, timeout_msg=None, error_msg=None, ctx=None):
-        if out_fn:
+    # a file opened for out_fn, or out_fn itself if it is a Trace sink or None
+    @staticmethod
+    @contextmanager
+    def _output(out_fn):
+        if out_fn and not hasattr(out_fn, 'push'):
             with open(out_fn, 'w', encoding='utf-8') as fp:
-                return self._communicate_fp(cmd, fp, timeout_msg, error_msg, ctx)
-        return self._communicate_fp(cmd, None, timeout_msg, error_msg, ctx)
+                yield fp
+        else:
+            yield out_fn
+
+    def _communicate(self, cmd, out_fn, timeout_msg=None, error_msg=None, ctx=None):
+        with self._output(out_fn) as fp:
+            return self._communicate_fp(cmd, fp, timeout_msg, error_msg, ctx)
 
 
 class BaseHexRunner(BaseRunner):
@@ -84,14 +195,13 @@ class BaseHexRunner(BaseRunner):
         self._handler_hex_path = _handler_hex_path
         self.tmp_dir = None
 
-    def _put_appendix(self, hex_path):
-        if self.appendix:
-            with open(hex_path, 'a', encoding='utf-8') as fp:
-                fp.write('\n' + self.appendix)
-
     def run(self, out_path):
         raise TypeError
 
+    # settings the verdicts depend on besides the design sources, for resuming a journal
+    def fingerprint(self):
+        return self.__class__.__name__, self.appendix
+
     # to support customized path, setter should be override and getters should return None before set
     def get_hex_path(self):
         return self._hex_path
@@ -118,6 +228,6 @@ class BaseHexRunner(BaseRunner):
     def run_loaded(out_path):
         raise TypeError
 
+    # the hex, with the appendix, is expected to be in place, see HexImage.put
     def __call__(self, out_path):
-        self._put_appendix(self.get_hex_path())
         return self.run(out_path)
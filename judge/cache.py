@@ -0,0 +1,152 @@
+import os, time, threading
+from hashlib import md5
+
+from .image import write_atomic
+from .trace import Trace
+from .defaults import answers_dir_default
+
+
+class Answer:
+    def __init__(self, hex_text, ans):
+        self.hex_text = hex_text
+        self.ans = ans  # text of the trace, or a compact Trace
+
+    # whether the answer can fill the sink, a text file or a compact Trace
+    def fits(self, ans_path):
+        return ans_path is None or (self.ans is not None and hasattr(self.ans, 'push') == hasattr(ans_path, 'push'))
+
+    def restore(self, ans_path=None):
+        if ans_path is None or self.ans is None:
+            return
+        if hasattr(ans_path, 'push'):
+            ans_path.a[:] = self.ans.a
+        else:
+            with open(ans_path, 'w', encoding='utf-8') as fp:
+                fp.write(self.ans)
+
+
+class AnswerCache:
+    def __init__(self, path=None):
+        self.path = path  # also keep the answers in this directory, so that they outlive the process
+        self.entries = {}
+        self.mutex = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(mars, asm_path, reference=None, handler=None):
+        with open(asm_path, 'rb') as fp:
+            h = md5(fp.read())
+        h.update(repr(mars.fingerprint()).encode())
+        if reference is not None:
+            h.update(repr(reference.fingerprint()).encode())
+            # MARS runs the handler of the case, the reference the one loaded into the judge
+            if handler is not None:
+                h.update(b'\0' + handler.encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        with self.mutex:
+            r = self.entries.get(key)
+            if r is None and self.path is not None:
+                r = self.load(key)
+                if r is not None:
+                    self.entries[key] = r
+            if r is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return r
+
+    def put(self, key, hex_text, ans_path=None):
+        if ans_path is None:
+            ans = None
+        elif hasattr(ans_path, 'push'):
+            ans = ans_path.copy()
+        else:
+            with open(ans_path, encoding='utf-8') as fp:
+                ans = fp.read()
+        r = Answer(hex_text, ans)
+        with self.mutex:
+            self.entries[key] = r
+            if self.path is not None:
+                self.save(key, r)
+        return r
+
+    def _file(self, key, ext):
+        return os.path.join(self.path, key + ext)
+
+    # the hex is written last, so that its presence means the answer is complete
+    def save(self, key, r):
+        os.makedirs(self.path, exist_ok=True)
+        stale = ()
+        if hasattr(r.ans, 'push'):
+            write_atomic(self._file(key, '.trc'), r.ans.tobytes())
+            stale = ('.ans',)
+        elif r.ans is not None:
+            write_atomic(self._file(key, '.ans'), r.ans)
+            stale = ('.trc',)
+        for ext in stale:
+            if os.path.exists(self._file(key, ext)):
+                os.remove(self._file(key, ext))
+        write_atomic(self._file(key, '.hex'), r.hex_text)
+
+    def load(self, key):
+        try:
+            with open(self._file(key, '.hex'), encoding='utf-8') as fp:
+                hex_text = fp.read()
+        except FileNotFoundError:
+            return None
+        ans = None
+        if os.path.isfile(self._file(key, '.trc')):
+            ans = Trace.load(self._file(key, '.trc'))
+        elif os.path.isfile(self._file(key, '.ans')):
+            with open(self._file(key, '.ans'), encoding='utf-8') as fp:
+                ans = fp.read()
+        return Answer(hex_text, ans)
+
+    # drop the answers on disk older than max_age secs, then the oldest ones beyond max_bytes
+    def prune(self, max_age=None, max_bytes=None):
+        if self.path is None or (max_age is None and max_bytes is None):
+            return 0
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return 0
+        answers = {}  # key -> [mtime, size, files]
+        for name in names:
+            key, ext = os.path.splitext(name)
+            if ext not in ('.hex', '.trc', '.ans'):
+                continue
+            fn = os.path.join(self.path, name)
+            try:
+                st = os.stat(fn)
+            except OSError:
+                continue
+            e = answers.setdefault(key, [0., 0, []])
+            e[0] = max(e[0], st.st_mtime)
+            e[1] += st.st_size
+            e[2].append(fn)
+
+        now = time.time()
+        total = sum(e[1] for e in answers.values())
+        removed = 0
+        for key, (mtime, size, files) in sorted(answers.items(), key=lambda kv: kv[1][0]):
+            if not ((max_age is not None and now - mtime > max_age) or (max_bytes is not None and total > max_bytes)):
+                break
+            # the hex first, as it marks the answer complete
+            for fn in sorted(files, key=lambda fn: not fn.endswith('.hex')):
+                try:
+                    os.remove(fn)
+                except OSError:
+                    pass
+            with self.mutex:
+                self.entries.pop(key, None)
+            total -= size
+            removed += 1
+        if removed:
+            print('Removed', removed, 'old answers from', self.path)
+        return removed
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,149 @@
+import os, sys, json, socket, tempfile, threading, contextlib
+
+socket_path_default = os.path.join(tempfile.gettempdir(),
+                                   'co-judge-{}.sock'.format(os.getuid() if hasattr(os, 'getuid') else 0))
+
+
+class StreamWriter:
+    def __init__(self, wfile, stream):
+        self.wfile = wfile
+        self.stream = stream
+
+    def write(self, s):
+        if s:
+            self.wfile.write(json.dumps({self.stream: s}, ensure_ascii=False) + '\n')
+            self.wfile.flush()
+        return len(s)
+
+    def flush(self):
+        pass
+
+
+class Daemon:
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path_default if socket_path is None else socket_path
+        self.judges = {}
+        self.indexes = {}
+        self.mutex = threading.Lock()  # jobs share runners and redirect stdout, so run one at a time
+
+    # judges are kept per working directory as well, which relative paths and tmp dirs resolve against
+    def get_judge(self, kind, runner_kw, mars_kw, diff_kw, cwd):
+        from .cache import AnswerCache
+        from .judge import MarsJudge
+        from .mars import Mars
+        from .diff import Diff
+
+        runner_kw = dict(runner_kw)
+        recompile = runner_kw.pop('recompile', False)
+        key = json.dumps([cwd, kind, runner_kw, mars_kw, diff_kw], sort_keys=True)
+        judge = self.judges.get(key)
+        if judge is None:
+            if kind == 'isim':
+                from .isim import ISim
+                runner = ISim(**runner_kw)
+            elif kind == 'logisim':
+                from .logisim import Logisim
+                runner = Logisim(**runner_kw)
+            else:
+                raise ValueError('unknown runner ' + kind)
+            judge = MarsJudge(runner, Mars(**mars_kw), Diff(**diff_kw), cache=AnswerCache())
+            self.judges[key] = judge
+        if recompile:
+            judge.runner.recompile = True
+        return judge
+
+    def get_paths(self, cases):
+        from .utils import resolve_paths
+        from .watch import Watcher
+
+        key = json.dumps(cases)
+        r = self.indexes.get(key)
+        if r is not None:
+            watcher, paths = r
+            if not watcher.poll():
+                return paths
+        watcher = Watcher(cases, ('*.asm',))
+        paths = resolve_paths(cases)
+        self.indexes[key] = watcher, paths
+        return paths
+
+    def run_job(self, job):
+        from .schedule import History
+
+        os.chdir(job['cwd'])
+        judge = self.get_judge(job['kind'], job['runner'], job['mars'], job['diff'], job['cwd'])
+        paths = self.get_paths(job['cases'])
+        kw = dict(job.get('all', {}))
+        history_fn = kw.pop('history', None)
+        if history_fn:
+            with History(history_fn) as history:
+                judge.all(paths, history=history, **kw)
+        else:
+            judge.all(paths, **kw)
+
+    def handle(self, sock):
+        with sock, sock.makefile('r', encoding='utf-8') as rfile, \
+                sock.makefile('w', encoding='utf-8') as wfile:
+            ok = False
+            try:
+                job = json.loads(rfile.readline())
+                with self.mutex, contextlib.redirect_stdout(StreamWriter(wfile, 'out')), \
+                        contextlib.redirect_stderr(StreamWriter(wfile, 'err')):
+                    try:
+                        self.run_job(job)
+                        ok = True
+                    except Exception as e:
+                        print('!! {}: {}'.format(e.__class__.__name__, e), file=sys.stderr)
+                wfile.write(json.dumps({'done': ok}) + '\n')
+                wfile.flush()
+            except (OSError, ValueError) as e:
+                print('Client lost:', e, file=sys.__stderr__)
+
+    def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(self.socket_path)
+            server.listen()
+            print('Judge daemon listening on', self.socket_path)
+            try:
+                while True:
+                    sock, _ = server.accept()
+                    threading.Thread(target=self.handle, args=(sock,), daemon=True).start()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                for judge in self.judges.values():
+                    judge.stop()
+                os.remove(self.socket_path)
+
+
+def submit(socket_path, kind, runner_kw, mars_kw, diff_kw, cases, all_kw=None):
+    job = {
+        'cwd': os.getcwd(),
+        'kind': kind,
+        'runner': runner_kw,
+        'mars': mars_kw,
+        'diff': diff_kw,
+        'cases': cases,
+        'all': {} if all_kw is None else all_kw,
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path_default if socket_path is None else socket_path)
+        with sock.makefile('r', encoding='utf-8') as rfile, sock.makefile('w', encoding='utf-8') as wfile:
+            wfile.write(json.dumps(job, ensure_ascii=False) + '\n')
+            wfile.flush()
+            for line in rfile:
+                msg = json.loads(line)
+                if 'done' in msg:
+                    return msg['done']
+                if 'out' in msg:
+                    sys.stdout.write(msg['out'])
+                    sys.stdout.flush()
+                else:
+                    sys.stderr.write(msg['err'])
+    return False
+
+
+if __name__ == '__main__':
+    Daemon(sys.argv[1] if len(sys.argv) > 1 else None).serve()
@@ -0,0 +1,10 @@
+import os, tempfile
+
+# settings the command line shows before it knows whether to judge or to submit to the daemon, kept apart
+# from the modules using them, so that a client starts without importing the judges
+timeout_default = 3
+INFINITE_LOOP = '1000ffff\n00000000\n'  # beq $0, $0, -1; nop;
+duration_default = '1000 us'
+store_dir_default = os.path.join('tmp', 'failures')
+answers_dir_default = os.path.join('tmp', 'answers')
+staging_root_default = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
@@ -1,7 +1,9 @@
 import os, subprocess
 from .base import VerificationFailed
+from .trace import Trace, first_mismatch
 
 diff_path_default = 'fc' if os.name == 'nt' else 'diff'
+context_default = 5
 
 
 class InconsistentResults(VerificationFailed):
@@ -10,20 +12,88 @@ class InconsistentResults(VerificationFailed):
 
 class Diff:
 
-    def __init__(self, diff_path=None, keep_output_files=False, permit_prefix=False):
+    def __init__(self, diff_path=None, keep_output_files=False, permit_prefix=False,
+                 compact=False, context=context_default, store=None):
         self.diff_path = diff_path_default if diff_path is None else diff_path
         self.keep_output_files = keep_output_files
         self.permit_prefix = permit_prefix
+        self.compact = compact
+        self.context = context
+        if isinstance(store, str):
+            from .artifacts import ArtifactStore  # only with a store, as it pulls in the compressors
+            store = ArtifactStore(store)
+        self.store = store
+        self.staging = None
+
+    def set_staging(self, staging):
+        self.staging = staging
+
+    # move artifacts out of the staging area, so that they survive the judge
+    def persist(self, *paths):
+        if self.staging is None:
+            return paths
+        return tuple(self.staging.persist(path) for path in paths)
+
+    # keep a failure in the artifact store only, dropping the raw traces unless they are to be kept
+    def store_failure(self, out_path, ans_path, out=None, ans=None):
+        name = os.path.splitext(os.path.basename(out_path))[0]
+        summary = self.store.record(name, out_path if out is None else out, ans_path if ans is None else ans,
+                                    self.permit_prefix)
+        if self.keep_output_files:
+            if out is not None:
+                out.render_to(out_path)
+                ans.render_to(ans_path)
+            self.persist(out_path, ans_path)
+        elif out is None:
+            os.remove(out_path)
+            os.remove(ans_path)
+        return summary
+
+    # where runners should put their outputs, a compact trace or a text file
+    def sink(self, path):
+        return Trace(path) if self.compact else path
+
+    def compare_traces(self, out: Trace, ans: Trace, log_path=None):
+        i = first_mismatch(out, ans, self.permit_prefix)
+        if i is None:
+            if self.keep_output_files:
+                out.render_to(out.path)
+                ans.render_to(ans.path)
+                self.persist(out.path, ans.path)
+            return
+
+        if self.store is not None:
+            raise InconsistentResults('output differs at line {}, see {}'
+                                      .format(i + 1, self.store_failure(out.path, ans.path, out, ans)))
+        out.render_to(out.path)
+        ans.render_to(ans.path)
+        if log_path is None:
+            log_path = out.path + '.diff'
+        start = max(i - self.context, 0)
+        stop = i + self.context + 1
+        with open(log_path, 'w', encoding='utf-8') as fp:
+            fp.write('first mismatch at line {} ({} vs {} lines)\n'.format(i + 1, len(out), len(ans)))
+            for name, trace in (('<', out), ('>', ans)):
+                fp.write('---\n')
+                for j, line in enumerate(trace.lines(start, stop), start):
+                    fp.write('{} {}{}\n'.format(name, line, '  <--' if j == i else ''))
+        raise InconsistentResults('output differs at line {}, see {}, {}, and {} for diff logs'
+                                  .format(i + 1, *self.persist(out.path, ans.path, log_path)))
 
     def __call__(self, out_path, ans_path, log_path=None):
+        if isinstance(out_path, Trace):
+            return self.compare_traces(out_path, ans_path, log_path)
+
         def complain():
             nonlocal log_path
+            if self.store is not None:
+                raise InconsistentResults('output differs, see {}'.format(self.store_failure(out_path, ans_path)))
             if log_path is None:
                 log_path = out_path + '.diff'
             with open(log_path, 'wb') as fp:
                 fp.write(res[0] + b'\n' + res[1])
             raise InconsistentResults('output differs, see {}, {}, and {} for diff logs'
-                                      .format(out_path, ans_path, log_path))
+                                      .format(*self.persist(out_path, ans_path, log_path)))
 
         with subprocess.Popen([self.diff_path, out_path, ans_path],
                               stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
@@ -41,6 +111,8 @@ class Diff:
                 else:
                     return complain()
 
-        if not self.keep_output_files:
+        if self.keep_output_files:
+            self.persist(out_path, ans_path)
+        else:
             os.remove(out_path)
             os.remove(ans_path)
@@ -0,0 +1,245 @@
+import os, sys, json, socket, threading, time
+from collections import deque
+
+from .base import VerificationFailed
+from .mars import SegmentNotFoundError
+from .utils import TmpDir
+
+port_default = 24680
+max_attempts_default = 3
+lease_default = 600  # secs a worker may take over a case before it is given to another
+artifact_limit = 1 << 22  # bytes of each artifact sent back to the coordinator
+
+OK = 'ok'
+FAILED = 'failed'
+PERMITTED = 'permitted'
+ERROR = 'error'
+LOST = 'lost'
+
+
+class Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.rfile = sock.makefile('r', encoding='utf-8', newline='\n')
+        self.wfile = sock.makefile('w', encoding='utf-8', newline='\n')
+
+    def send(self, **msg):
+        self.wfile.write(json.dumps(msg, ensure_ascii=False) + '\n')
+        self.wfile.flush()
+
+    def recv(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError('connection closed')
+        return json.loads(line)
+
+    def close(self):
+        for f in (self.rfile, self.wfile, self.sock):
+            try:
+                f.close()
+            except OSError:
+                pass
+
+
+class Coordinator:
+    def __init__(self, asm_paths, host='127.0.0.1', port=port_default, config=None,
+                 lease=lease_default, max_attempts=max_attempts_default,
+                 artifact_dir=None, on_result=None):
+        self.cases = list(asm_paths)
+        self.host = host
+        self.port = port
+        self.config = {} if config is None else config
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.artifact_dir = TmpDir(os.path.join('tmp', 'dist') if artifact_dir is None else artifact_dir)
+        self.on_result = on_result
+
+        self.pending = deque(range(len(self.cases)))
+        self.attempts = [0] * len(self.cases)
+        self.results = {}
+        self.cond = threading.Condition()
+        self.sock = None
+
+    def bind(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        return self.port
+
+    def finished(self):
+        return len(self.results) == len(self.cases)
+
+    def take(self):
+        with self.cond:
+            while not self.pending and not self.finished():
+                self.cond.wait()
+            if self.pending:
+                i = self.pending.popleft()
+                self.attempts[i] += 1
+                return i
+            return None
+
+    def requeue(self, i, worker):
+        with self.cond:
+            if i in self.results:
+                return
+            if self.attempts[i] >= self.max_attempts:
+                self.finish(i, {'verdict': LOST, 'error': 'worker lost {} times'.format(self.attempts[i])})
+            else:
+                print('Requeueing', self.cases[i], 'after losing', worker, file=sys.stderr)
+                self.pending.appendleft(i)
+            self.cond.notify_all()
+
+    def finish(self, i, result):
+        with self.cond:
+            if i in self.results:
+                return
+            result['path'] = self.cases[i]
+            artifacts = result.pop('artifacts', None)
+            if artifacts:
+                base = '{}-{}'.format(i, os.path.basename(self.cases[i]))
+                result['artifacts'] = paths = []
+                for suffix, text in artifacts.items():
+                    path = os.path.join(self.artifact_dir(), base + suffix)
+                    with open(path, 'w', encoding='utf-8') as fp:
+                        fp.write(text)
+                    paths.append(path)
+            self.results[i] = result
+            self.cond.notify_all()
+
+        verdict = result['verdict']
+        if verdict == OK:
+            print('{}/{}'.format(len(self.results), len(self.cases)), result['path'], 'ok',
+                  '({}, {:.2f}s)'.format(result.get('worker'), result.get('elapsed', 0)))
+        else:
+            print('!!', result['path'] + ':', verdict, result.get('error', ''), file=sys.stderr)
+        if self.on_result:
+            self.on_result(result)
+
+    def handle(self, sock, addr):
+        conn = Connection(sock)
+        if self.lease:
+            sock.settimeout(self.lease)
+        worker = '{}:{}'.format(*addr[:2])
+        i = None
+        try:
+            hello = conn.recv()
+            worker = hello.get('name') or worker
+            conn.send(op='config', config=self.config)
+            while True:
+                msg = conn.recv()
+                if msg['op'] == 'result':
+                    msg.pop('op')
+                    msg['worker'] = worker
+                    self.finish(msg.pop('id'), msg)
+                    i = None
+                elif msg['op'] == 'next':
+                    i = self.take()
+                    if i is None:
+                        conn.send(op='done')
+                        break
+                    path = self.cases[i]
+                    with open(path, encoding='utf-8', errors='ignore') as fp:
+                        asm = fp.read()
+                    conn.send(op='case', id=i, name=os.path.basename(path), asm=asm)
+        except (OSError, ValueError, KeyError) as e:
+            print('Lost worker', worker + ':', e, file=sys.stderr)
+        finally:
+            conn.close()
+            if i is not None:
+                self.requeue(i, worker)
+
+    def serve(self):
+        if self.sock is None:
+            self.bind()
+        print('Serving {} cases on {}:{}'.format(len(self.cases), self.host, self.port))
+        self.sock.settimeout(0.5)
+        try:
+            while not self.finished():
+                try:
+                    sock, addr = self.sock.accept()
+                except socket.timeout:
+                    continue
+                sock.settimeout(None)
+                threading.Thread(target=self.handle, args=(sock, addr), daemon=True).start()
+        finally:
+            self.sock.close()
+        return [self.results[i] for i in range(len(self.cases))]
+
+
+def read_artifact(path):
+    try:
+        with open(path, encoding='utf-8', errors='ignore') as fp:
+            return fp.read(artifact_limit)
+    except FileNotFoundError:
+        return None
+
+
+class Worker:
+    def __init__(self, judge, host='127.0.0.1', port=port_default, name=None, setup=None):
+        self.judge = judge
+        self.host = host
+        self.port = port
+        self.name = '{}-{}'.format(socket.gethostname(), os.getpid()) if name is None else name
+        self.setup = setup
+        self.work_dir = TmpDir(os.path.join('tmp', 'worker-' + str(judge.id)))
+
+    # with staging, Diff has moved the outputs of a failure out of the staging area
+    def artifact_path(self, path):
+        staging = self.judge.staging
+        if staging is None or os.path.exists(path):
+            return path
+        return staging.persisted_path(path)
+
+    def run_case(self, i, name, asm):
+        path = os.path.join(self.work_dir(), '{}-{}'.format(i, name))
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write(asm)
+        _, out_path, ans_path = self.judge.get_paths(path)
+
+        start = time.perf_counter()
+        result = {'verdict': OK}
+        try:
+            self.judge(path)
+        except SegmentNotFoundError as e:
+            result = {'verdict': PERMITTED, 'error': str(e)}
+        except VerificationFailed as e:
+            result = {'verdict': FAILED, 'error': '{}: {}'.format(e.__class__.__name__, e)}
+        except Exception as e:
+            result = {'verdict': ERROR, 'error': '{}: {}'.format(e.__class__.__name__, e)}
+        result['elapsed'] = time.perf_counter() - start
+
+        if result['verdict'] in (FAILED, ERROR):
+            artifacts = {}
+            for suffix, p in (('.out', out_path), ('.ans', ans_path), ('.diff', out_path + '.diff')):
+                text = read_artifact(self.artifact_path(p))
+                if text is not None:
+                    artifacts[suffix] = text
+            result['artifacts'] = artifacts
+        os.remove(path)
+        return result
+
+    def run(self):
+        cnt = 0
+        with socket.create_connection((self.host, self.port)) as sock:
+            conn = Connection(sock)
+            try:
+                conn.send(op='hello', name=self.name)
+                config = conn.recv()['config']
+                if self.setup:
+                    self.setup(self.judge, config)
+                while True:
+                    conn.send(op='next')
+                    msg = conn.recv()
+                    if msg['op'] != 'case':
+                        break
+                    print('Judging', msg['name'], '...')
+                    result = self.run_case(msg['id'], msg['name'], msg['asm'])
+                    conn.send(op='result', id=msg['id'], **result)
+                    cnt += 1
+            finally:
+                conn.close()
+        print('Worker', self.name, 'judged', cnt, 'cases')
+        return cnt
@@ -0,0 +1,280 @@
+import os, sys, json, time, random, threading
+
+from .base import VerificationFailed
+from .concurrent import PropagatingThread
+from .utils import TmpDir
+
+fuzz_dir_default = os.path.join('tmp', 'fuzz')
+
+# registers random instructions may touch, keeping $0, $at, $gp, $sp, $fp and $ra out of it
+regs_default = tuple(range(8, 24))
+
+alu_r = ('addu', 'subu', 'and', 'or', 'xor', 'nor', 'slt', 'sltu', 'sllv', 'srlv', 'srav')
+alu_shift = ('sll', 'srl', 'sra')
+alu_i = ('addiu', 'andi', 'ori', 'xori', 'slti', 'sltiu')
+loads = (('lw', 4), ('lh', 2), ('lhu', 2), ('lb', 1), ('lbu', 1))
+stores = (('sw', 4), ('sh', 2), ('sb', 1))
+branches_2 = ('beq', 'bne')
+branches_1 = ('blez', 'bgtz', 'bltz', 'bgez')
+muldiv = ('mult', 'multu', 'div', 'divu')
+
+
+# random programs that always terminate: branches and jumps only go forward, and the subroutines
+# called by jal are leaves placed after the main body, so that they return with jr $ra
+class Generator:
+    def __init__(self, length=200, hazard=0.6, branch=0.08, jump=0.03, memory=64, regs=regs_default,
+                 muldiv=True, subroutines=2, subroutine_length=12):
+        self.length = length
+        self.hazard = hazard  # chance that a source register was written by one of the last few instructions
+        self.branch = branch
+        self.jump = jump  # chance of j or jal
+        self.memory = memory  # data footprint in words, from address 0
+        self.regs = tuple(regs)
+        self.muldiv = muldiv
+        self.subroutines = subroutines
+        self.subroutine_length = subroutine_length
+
+    def config(self):
+        return dict(length=self.length, hazard=self.hazard, branch=self.branch, jump=self.jump,
+                    memory=self.memory, regs=list(self.regs), muldiv=self.muldiv,
+                    subroutines=self.subroutines, subroutine_length=self.subroutine_length)
+
+    def generate(self, seed):
+        return _Program(self, random.Random(seed)).render()
+
+
+class _Program:
+    def __init__(self, gen, rng):
+        self.gen = gen
+        self.rng = rng
+        self.recent = []
+        self.labels = 0
+
+    def reg(self):
+        return '${}'.format(self.rng.choice(self.gen.regs))
+
+    # a source register, likely one written just before when hazards are dense
+    def src(self):
+        if self.recent and self.rng.random() < self.gen.hazard:
+            return self.rng.choice(self.recent[-3:])
+        return self.reg()
+
+    def dst(self):
+        r = self.reg()
+        self.recent.append(r)
+        return r
+
+    def imm(self):
+        return self.rng.choice((self.rng.randrange(0x10000), self.rng.randrange(16), 0xffff, 0x8000))
+
+    def label(self):
+        self.labels += 1
+        return 'L{}'.format(self.labels)
+
+    def plain(self):
+        rng = self.rng
+        x = rng.random()
+        if x < 0.12:
+            return self.memory()
+        if x < 0.2 and self.gen.muldiv:
+            op = rng.choice(muldiv + ('mfhi', 'mflo', 'mthi', 'mtlo'))
+            if op in ('mfhi', 'mflo'):
+                return ['{} {}'.format(op, self.dst())]
+            if op in ('mthi', 'mtlo'):
+                return ['{} {}'.format(op, self.src())]
+            if op.startswith('div'):
+                # keep the divisor nonzero, MARS and the CPU may disagree on HI and LO otherwise
+                d = self.src()
+                return ['ori {0}, {0}, 1'.format(d), '{} {}, {}'.format(op, self.src(), d)]
+            return ['{} {}, {}'.format(op, self.src(), self.src())]
+        if x < 0.3:
+            return ['lui {}, {}'.format(self.dst(), self.imm())]
+        if x < 0.45:
+            return ['{} {}, {}, {}'.format(rng.choice(alu_shift), self.dst(), self.src(), rng.randrange(32))]
+        if x < 0.7:
+            return ['{} {}, {}, {}'.format(rng.choice(alu_i), self.dst(), self.src(), self.imm() & 0x7fff)]
+        d = self.dst()
+        return ['{} {}, {}, {}'.format(rng.choice(alu_r), d, self.src(), self.src())]
+
+    def memory(self):
+        rng = self.rng
+        op, size = rng.choice(loads + stores)
+        addr = rng.randrange(self.gen.memory * 4) // size * size
+        if rng.random() < self.gen.hazard:
+            # the base is set right before, exercising forwarding into the address
+            base = self.dst()
+            off = rng.randrange(addr + 1) // size * size
+            r = ['ori {}, $0, {}'.format(base, addr - off)]
+        else:
+            base, off, r = '$0', addr, []
+        if op[0] == 'l':
+            r.append('{} {}, {}({})'.format(op, self.dst(), off, base))
+        else:
+            r.append('{} {}, {}({})'.format(op, self.src(), off, base))
+        return r
+
+    # a body of blocks, each a list of lines; control transfers take targets from later blocks only
+    def body(self, n, calls):
+        rng = self.rng
+        blocks = []
+        targets = {}
+        for i in range(n):
+            x = rng.random()
+            if x < self.gen.branch and i + 2 < n:
+                t = rng.randrange(i + 2, min(n, i + 10) + 1)
+                label = targets.setdefault(t, self.label())
+                if rng.random() < 0.5:
+                    block = ['{} {}, {}, {}'.format(rng.choice(branches_2), self.src(), self.src(), label)]
+                else:
+                    block = ['{} {}, {}'.format(rng.choice(branches_1), self.src(), label)]
+            elif x < self.gen.branch + self.gen.jump and i + 2 < n:
+                if calls and rng.random() < 0.5:
+                    block = ['jal {}'.format(rng.choice(calls))]
+                else:
+                    t = rng.randrange(i + 2, min(n, i + 10) + 1)
+                    block = ['j {}'.format(targets.setdefault(t, self.label()))]
+            else:
+                blocks.append(self.plain())
+                continue
+            # the delay slot, a single instruction that is never a control transfer itself; it runs after a
+            # taken branch only with delayed branching, and jal links past it, so the programs mean different
+            # things with and without db, and the judge must follow the design
+            slot = self.plain()
+            while len(slot) > 1:
+                slot = self.plain()
+            blocks.append(block + slot)
+        lines = []
+        for i, block in enumerate(blocks):
+            if i in targets:
+                lines.append(targets[i] + ':')
+            lines += block
+        if n in targets:
+            lines.append(targets[n] + ':')
+        return lines
+
+    def render(self):
+        calls = ['F{}'.format(i) for i in range(self.gen.subroutines)]
+        lines = ['.text'] + self.body(self.gen.length, calls) + ['j END', 'nop']
+        for name in calls:
+            lines.append(name + ':')
+            lines += self.body(self.gen.subroutine_length, [])
+            lines += ['jr $ra', 'nop']
+        lines += ['END:', 'nop']
+        return '\n'.join(line if line.endswith(':') else '    ' + line for line in lines) + '\n'
+
+
+class CampaignResult:
+    def __init__(self):
+        self.programs = 0
+        self.failures = []
+        self.elapsed = 0.
+
+    def rate(self):
+        return self.programs / self.elapsed if self.elapsed else 0.
+
+    def __str__(self):
+        return '{} programs in {:.1f}s, {:.2f} programs/s, {} failed'.format(
+            self.programs, self.elapsed, self.rate(), len(self.failures))
+
+
+# judge generated programs with one judge per worker until the budget in secs runs out
+class Campaign:
+    def __init__(self, make_judge, generator=None, workers=1, budget=60., seed=None,
+                 fuzz_dir=fuzz_dir_default, max_programs=None):
+        self.make_judge = make_judge  # called once per worker, as judges own their runners
+        self.generator = Generator() if generator is None else generator
+        self.workers = workers
+        self.budget = budget
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        self.fuzz_dir = TmpDir(fuzz_dir)
+        self.max_programs = max_programs
+
+        self.next_seed = self.seed
+        self.mutex = threading.Lock()
+        self.result = CampaignResult()
+
+    def take(self):
+        with self.mutex:
+            if self.max_programs is not None and self.next_seed - self.seed >= self.max_programs:
+                return None
+            r = self.next_seed
+            self.next_seed += 1
+            return r
+
+    def save(self, seed, asm, e):
+        d = os.path.join(self.fuzz_dir(), 'failures')
+        os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, '{}.asm'.format(seed)), 'w', encoding='utf-8') as fp:
+            fp.write(asm)
+        with self.mutex:
+            self.result.failures.append(seed)
+            with open(os.path.join(self.fuzz_dir(), 'seeds.jsonl'), 'a', encoding='utf-8') as fp:
+                fp.write(json.dumps({'seed': seed, 'generator': self.generator.config(),
+                                     'error': '{}: {}'.format(e.__class__.__name__, e)}) + '\n')
+
+    def work(self, k, deadline):
+        judge = self.make_judge()
+        # one file per worker, rewritten for every program
+        asm_path = os.path.join(self.fuzz_dir(), 'fuzz-{}.asm'.format(k))
+        try:
+            while time.perf_counter() < deadline:
+                seed = self.take()
+                if seed is None:
+                    break
+                asm = self.generator.generate(seed)
+                with open(asm_path, 'w', encoding='utf-8') as fp:
+                    fp.write(asm)
+                try:
+                    judge(asm_path)
+                except (VerificationFailed, RuntimeError) as e:  # a crash or a forbidden timeout fails too
+                    print('!! seed', seed, e.__class__.__name__, e, file=sys.stderr)
+                    self.save(seed, asm, e)
+                with self.mutex:
+                    self.result.programs += 1
+        finally:
+            close = getattr(judge, 'close', None)
+            if close:
+                close()
+
+    def run(self):
+        start = time.perf_counter()
+        deadline = start + self.budget
+        threads = [PropagatingThread(target=self.work, args=(k, deadline)) for k in range(self.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.result.elapsed = time.perf_counter() - start
+        print('Fuzzing from seed {}: {}'.format(self.seed, self.result))
+        return self.result
+
+
+# judge the program of a saved seed again, returning the path it was written to
+def replay(judge, seed, generator=None, fuzz_dir=fuzz_dir_default):
+    if generator is None:
+        generator = Generator()
+    elif isinstance(generator, dict):
+        generator = Generator(**generator)
+    asm_path = os.path.join(TmpDir(fuzz_dir)(), 'replay-{}.asm'.format(seed))
+    with open(asm_path, 'w', encoding='utf-8') as fp:
+        fp.write(generator.generate(seed))
+    judge(asm_path)
+    return asm_path
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Print a random MIPS program generated from a seed.')
+    parser.add_argument('seed', type=int)
+    parser.add_argument('--length', type=int, default=200, help='instructions in the main body, 200 by default')
+    parser.add_argument('--hazard', type=float, default=0.6,
+                        help='chance of reading a register written just before, 0.6 by default')
+    parser.add_argument('--branch', type=float, default=0.08, help='chance of a branch, 0.08 by default')
+    parser.add_argument('--jump', type=float, default=0.03, help='chance of j or jal, 0.03 by default')
+    parser.add_argument('--memory', type=int, default=64, help='data footprint in words, 64 by default')
+    args = parser.parse_args()
+    print(Generator(args.length, args.hazard, args.branch, args.jump, args.memory).generate(args.seed), end='')
+
+
+if __name__ == '__main__':
+    main()
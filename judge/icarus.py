@@ -0,0 +1,116 @@
+import os, glob, subprocess, threading
+from hashlib import md5
+
+from .base import BaseHexRunner, VerificationFailed
+from .isim import ISim
+from .utils import TmpDir
+
+cache_dir_default = os.path.join('tmp', 'vvp')
+
+
+class CompileError(VerificationFailed):
+    pass
+
+
+def resolve_sources(sources):
+    if isinstance(sources, str):
+        sources = [sources]
+    r = []
+    for p in sources:
+        if os.path.isdir(p):
+            r += sorted(glob.glob(os.path.join(p, '**', '*.v'), recursive=True))
+        else:
+            r += sorted(glob.glob(p)) or [p]
+    return r
+
+
+class Icarus(BaseHexRunner):
+    name = 'Icarus'
+
+    def __init__(self, sources, top=None,
+                 iverilog_path='iverilog',
+                 vvp_path='vvp',
+                 cache_dir=cache_dir_default,
+                 include_dirs=(),
+                 defines=(),
+                 flags=(),
+                 plusargs=None,
+                 **kw
+                 ):
+        super().__init__(**kw)
+        self.sources = sources
+        self.top = top
+        self.iverilog_path = iverilog_path
+        self.vvp_path = vvp_path
+        self.cache_dir = TmpDir(cache_dir)
+        self.include_dirs = list(include_dirs)
+        self.defines = list(defines)
+        self.flags = list(flags)
+        self.plusargs = {} if plusargs is None else plusargs
+        self.recompile = True
+        self.vvp_file = None
+
+    parse = staticmethod(ISim.parse)
+
+    def fingerprint(self):
+        return super().fingerprint() + (self.sources, self.top, self.include_dirs, self.defines, self.flags,
+                                        self.plusargs)
+
+    def set_hex_path(self, path):
+        self._set_hex_path(path)
+
+    def set_handler_hex_path(self, path):
+        self._set_handler_hex_path(path)
+
+    def compile_cmd(self, files, out):
+        cmd = [self.iverilog_path, '-o', out]
+        if self.top:
+            cmd += ['-s', self.top]
+        for d in self.include_dirs:
+            cmd += ['-I', d]
+        for d in self.defines:
+            cmd.append('-D' + d)
+        return cmd + self.flags + files
+
+    # every file iverilog may `include, as a header changing must also change the cache key
+    def include_files(self):
+        r = []
+        for d in self.include_dirs:
+            for root, dirs, names in os.walk(d):
+                dirs.sort()
+                r += [os.path.join(root, name) for name in sorted(names)]
+        return r
+
+    def compile(self):
+        files = resolve_sources(self.sources)
+        h = md5(repr(self.compile_cmd([], '')).encode())
+        for fn in files + self.include_files():
+            with open(fn, 'rb') as fp:
+                h.update(fn.encode() + b'\0' + fp.read())
+        vvp_file = os.path.join(self.cache_dir(), '{}-{}.vvp'.format(self.top or 'tb', h.hexdigest()[:10]))
+
+        if not os.path.exists(vvp_file):
+            print('Compiling', len(files), 'sources into', vvp_file)
+            tmp = '{}.{}-{}.tmp'.format(vvp_file, os.getpid(), threading.get_ident())
+            res = subprocess.run(self.compile_cmd(files, tmp),
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if res.returncode:
+                raise CompileError('iverilog returned {}: {}'.format(
+                    res.returncode, res.stdout.decode(errors='ignore').strip()))
+            os.replace(tmp, vvp_file)
+        self.vvp_file = vvp_file
+
+    def run(self, out_path):
+        if self.recompile or self.vvp_file is None:
+            self.compile()
+            self.recompile = False
+
+        cmd = [self.vvp_path, '-n', self.vvp_file, '+hex=' + self.get_hex_path()]
+        handler = self.get_handler_hex_path()
+        if handler:
+            cmd.append('+handler=' + handler)
+        cmd += ['+{}={}'.format(k, v) for k, v in self.plusargs.items()]
+        self._communicate(cmd, out_path,
+                          'see {}'.format(out_path),
+                          'maybe vvp is not found'
+                          )
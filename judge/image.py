@@ -0,0 +1,45 @@
+import os, threading
+
+
+# write through a temporary file and rename, skipping targets that already hold the same content
+def write_atomic(path, data):
+    if isinstance(data, str):
+        data = data.encode()
+    try:
+        with open(path, 'rb') as fp:
+            if fp.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    tmp = '{}.{}-{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(tmp, 'wb') as fp:
+        fp.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+class HexImage:
+    def __init__(self, text, handler=None):
+        self.text = text
+        self.handler = handler
+
+    @classmethod
+    def load(cls, path, handler_path=None):
+        with open(path, encoding='utf-8') as fp:
+            text = fp.read()
+        handler = None
+        if handler_path:
+            with open(handler_path, encoding='utf-8') as fp:
+                handler = fp.read()
+        return cls(text, handler)
+
+    def render(self, appendix=None):
+        return self.text + '\n' + appendix if appendix else self.text
+
+    def put(self, runner, hex_path=None):
+        r = write_atomic(runner.get_hex_path() if hex_path is None else hex_path,
+                         self.render(runner.appendix))
+        handler_path = runner.get_handler_hex_path()
+        if self.handler is not None and handler_path:
+            r = write_atomic(handler_path, self.handler) or r
+        return r
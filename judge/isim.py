@@ -1,11 +1,14 @@
-import os, subprocess
-from .base import VerificationFailed, BaseHexRunner
+import os, sys, subprocess, time
+from .base import VerificationFailed, BaseHexRunner, handle_output
+from .accounting import Usage
+from .isim_session import IsimSession
+from .session import SessionCrashed, SessionTimeout
 from .utils import kill_im
+from .defaults import duration_default
 
 tcl_common_fn = 'judge.cmd'
 hex_common_fn = 'code.txt'
 handler_hex_common_fn = 'code_handler.txt'
-duration_default = '1000 us'
 
 nil = object()
 
@@ -51,6 +54,7 @@ class ISim(BaseHexRunner):
                  recompile=False,
                  ise_path=None,
                  tcl_fn=tcl_common_fn,
+                 session=False,
                  **kw
                  ):
         env = os.environ.copy()
@@ -102,9 +106,18 @@ class ISim(BaseHexRunner):
         self.tb_path = tb_path
         self.tcl_fn = tcl_fn
         self.tcl_path = os.path.join(tb_dir, tcl_fn)
-        tcl_text = 'run {}\nexit\n'.format(duration.strip())
+        self.duration = duration.strip()
+        tcl_text = 'run {}\nexit\n'.format(self.duration)
         self._generate_tcl(self.tcl_path, tcl_text)
 
+        self.session = None
+        if session:
+            self.session = IsimSession(**dict(session if isinstance(session, dict) else {},
+                                              cwd=tb_dir, env=env))
+
+    def fingerprint(self):
+        return super().fingerprint() + (self.module_name, self.tb_dir, self.duration)
+
     @staticmethod
     def _generate_tcl(path, s):
         with open(path, 'w', encoding='utf-8') as fp:
@@ -135,11 +148,38 @@ class ISim(BaseHexRunner):
         if self.recompile:
             self.compile()
             self.recompile = False
+            if self.session is not None:
+                self.session.kill()
+        if self.session is not None and self.run_session(out_path):
+            return
         self._communicate([os.path.normcase(self.tb_path), '-tclbatch', self.tcl_fn],
                           out_path,
-                          'see ' + out_path,
+                          'see {}'.format(out_path),
                           'maybe ISE path is incorrect'
                           )
 
+    # run in the kept simulator, returning False if it crashed and the case should be run on its own
+    def run_session(self, out_path):
+        with self._output(out_path) as fp:
+            handler = self.output_handler(fp)
+            start = time.perf_counter()
+            try:
+                s = self.session.run([os.path.normcase(self.tb_path)], self.duration, self.timeout)
+            except SessionTimeout as e:
+                handle_output(e.output, fp, handler, raw_output_file=self.raw_output_file)
+                self._timed_out('see {}'.format(out_path), e)
+                return True
+            except SessionCrashed:
+                print('Warning: ISim session crashed, rerunning the case in a new simulator', file=sys.stderr)
+                return False
+            handle_output(s, fp, handler, raw_output_file=self.raw_output_file)
+        self.accounting.record(Usage(time.perf_counter() - start, output=len(s), n=1))
+        return True
+
     def stop(self):
-        kill_im(self.tb_basename)
+        if self.session is not None:
+            self.session.kill()
+        if os.name == 'nt':
+            kill_im(self.tb_basename)
+        else:
+            super().stop()
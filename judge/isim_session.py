@@ -0,0 +1,68 @@
+import re, sys, threading
+
+from .session import Session, SessionCrashed, SessionTimeout
+
+sentinel = 'judge-session-done'
+start_timeout_default = 60
+
+
+# one ISim simulator kept open in its tcl shell, rerunning the test bench with restart and run for each case
+class IsimSession:
+    def __init__(self, command=None, cwd=None, env=None, start_timeout=start_timeout_default):
+        self.command = command  # the simulator by default, or a stand-in speaking the same tcl
+        self.cwd = cwd
+        self.env = env
+        self.start_timeout = start_timeout
+
+        self.session = None
+        self.seq = 0
+        self.mutex = threading.Lock()
+        self.spawns = 0
+        self.requests = 0
+
+    # the sentinel is computed by tcl, so that an echo of the command itself never matches
+    def _sync(self, timeout):
+        self.seq += 1
+        self.session.send('puts "{}-[expr {{{}}}]"\n'.format(sentinel, self.seq))
+        pattern = re.compile(r'{}-{}\s*$'.format(sentinel, self.seq).encode())
+        return self.session.read_until(lambda l: pattern.search(l) is not None, timeout)[0]
+
+    def start(self, command):
+        self.session = Session(self.command or command, self.cwd, self.env)
+        self.spawns += 1
+        try:
+            self._sync(self.start_timeout)
+        except (SessionTimeout, SessionCrashed):
+            self.session = None
+            raise
+
+    def kill(self):
+        session, self.session = self.session, None
+        if session is not None:
+            session.kill()
+
+    # rerun the test bench, which reloads the hex files, returning the output of the simulation
+    def run(self, command, duration, timeout=None):
+        with self.mutex:
+            if self.session is None:
+                self.start(command)
+            self.requests += 1
+            try:
+                self.session.send('restart\nrun {}\n'.format(duration))
+                return self._sync(timeout)
+            except (SessionTimeout, SessionCrashed):
+                self.session = None
+                raise
+
+    def close(self):
+        with self.mutex:
+            session, self.session = self.session, None
+            if session is not None:
+                try:
+                    session.send('exit\n')
+                except SessionCrashed:
+                    return
+                session.close()
+
+    def report(self, file=sys.stdout):
+        print('ISim session: {} cases over {} launches'.format(self.requests, self.spawns), file=file)
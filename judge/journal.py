@@ -0,0 +1,80 @@
+import os, json, time, threading
+
+from .image import write_atomic
+from .schedule import History, PASSED
+
+journal_fn_default = os.path.join('tmp', 'journal.jsonl')
+
+PERMITTED = 'permitted'
+
+
+class ResumeRefused(Exception):
+    pass
+
+
+# an append-only progress journal of all(), a header with the configuration fingerprint followed by one
+# JSON line per finished case, so that an interrupted run can continue from its first unfinished case
+class Journal:
+    def __init__(self, fn=journal_fn_default):
+        self.fn = fn
+        self.entries = {}
+        self.mutex = threading.Lock()
+
+    key = staticmethod(History.key)
+
+    # start a fresh journal, or with resume, continue the one on disk if it was written by the same configuration
+    def open(self, fingerprint, resume=False):
+        self.entries = {}
+        header = None
+        if resume:
+            try:
+                with open(self.fn, encoding='utf-8') as fp:
+                    text = fp.read()
+            except FileNotFoundError:
+                text = ''
+            good = []
+            for line in text.splitlines():
+                try:
+                    e = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    continue  # torn by the interruption
+                good.append(line)
+                if header is None:
+                    header = e
+                else:
+                    self.entries[e['case']] = e
+            if header is not None and header.get('fingerprint') != fingerprint:
+                self.entries = {}
+                raise ResumeRefused('{} was written by another judge configuration ({} vs {}), '
+                                    'start over without resume'.format(self.fn, header.get('fingerprint'),
+                                                                       fingerprint))
+        d = os.path.dirname(self.fn)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        if header is None:
+            self._write({'fingerprint': fingerprint, 'time': time.time()}, 'w')
+        elif len(good) != len(text.splitlines()) or not text.endswith('\n'):
+            # drop the torn lines, so that the next line appended starts on a line of its own
+            write_atomic(self.fn, ''.join(line + '\n' for line in good))
+        return self
+
+    # a line at a time, so that whatever was judged before an interruption is on disk
+    def _write(self, e, mode='a'):
+        with open(self.fn, mode, encoding='utf-8') as fp:
+            fp.write(json.dumps(e, ensure_ascii=False) + '\n')
+
+    def record(self, path, verdict, answer_key=None):
+        e = {'case': self.key(path), 'verdict': verdict}
+        if answer_key is not None:
+            e['answer'] = answer_key
+        with self.mutex:
+            self.entries[e['case']] = e
+            self._write(e)
+
+    def get(self, path):
+        return self.entries.get(self.key(path))
+
+    # failed cases are judged again, as they are what the run was interrupted to fix
+    def completed(self, path):
+        e = self.get(path)
+        return e is not None and e['verdict'] in (PASSED, PERMITTED)
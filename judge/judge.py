@@ -1,30 +1,64 @@
-import os, sys, shutil
+import os, sys, time, shutil
+from hashlib import md5
 from random import randint
-from typing import Iterable, Optional
+from typing import Iterable, List, Optional
 
 from .base import BaseHexRunner, VerificationFailed
 from .mars import Mars, SegmentNotFoundError
+from .sim import CrossCheckFailed
 from .diff import Diff
+from .cache import AnswerCache
+from .schedule import History, schedule, PASSED, FAILED
+from .journal import Journal, PERMITTED
+from .progress import Progress, TIMED_OUT
+from .staging import Staging
+from .image import HexImage, write_atomic
+from .trace import Trace, first_mismatch, render
+from .concurrent import PropagatingThread
+from .accounting import report as report_usage
 from .utils import TmpDir
 
 tmp_pre = 'tmp'
 
 handler_segment = '0x4180-0x4ffc'
 
-def sync_path(src, dst):
-    if not is_path_same(dst, src):
-        shutil.copy(src, dst)
-
 class BaseJudge:
     def __init__(self, runners: Iterable[BaseHexRunner],
-                 mars: Mars, diff: Optional[Diff] = None):
+                 mars: Mars, diff: Optional[Diff] = None,
+                 cache: Optional[AnswerCache] = None,
+                 staging: Optional[Staging] = None):
         self.runners = runners
         self.mars = mars
         self.diff = Diff() if diff is None else diff
+        self.cache = cache
+        self.staging = staging
+        self.handler = None
+        self.reference = None
+        self.cross_check = False
+        self.progress = None
         self.id = randint(100000, 999999)
-        self.tmp_dir = tmp_dir = TmpDir(os.path.join(tmp_pre, str(self.id)))
+        if staging is None:
+            self.tmp_dir = TmpDir(os.path.join(tmp_pre, str(self.id)))
+            self.common_tmp = common_tmp
+        else:
+            self.tmp_dir = staging.tmp_dir(str(self.id))
+            self.common_tmp = staging.root
+        self.diff.set_staging(staging)
         for runner in runners:
-            runner.set_tmp_dir(tmp_dir)
+            runner.set_tmp_dir(self.tmp_dir)
+
+    def get_paths(self, asm_path):
+        return get_paths(asm_path, self.common_tmp())
+
+    # produce answers with a built-in simulator, using MARS only to assemble, or also to compare against
+    def set_reference(self, reference, cross_check=False):
+        self.reference = reference
+        self.cross_check = cross_check
+
+    def close(self):
+        self.stop()
+        if self.staging is not None:
+            self.tmp_dir.cleanup()
 
     def get_path(self, get, set, fn):
         r = get()
@@ -41,6 +75,71 @@ class BaseJudge:
         return self.get_path(runner.get_handler_hex_path, runner.set_handler_hex_path,
                              asm_base + '-h.hex')
 
+    # dump the image and optionally the answer trace, reusing cached ones if possible
+    def run_mars(self, asm_path, ans_path=None):
+        self.note('mars')
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(self.mars, asm_path, self.reference, self.handler)
+            r = self.cache.get(key)
+            if r is not None and r.fits(ans_path):
+                r.restore(ans_path)
+                return HexImage(r.hex_text, self.handler)
+
+        hex_path = os.path.join(self.tmp_dir(), os.path.basename(asm_path) + '.text')
+        if ans_path is not None and self.reference is not None:
+            image = self.run_reference(asm_path, hex_path, ans_path)
+            if key is not None:
+                self.cache.put(key, image.text, ans_path)
+            return image
+        if ans_path is None:
+            self.mars(asm_path=asm_path, hex_path=hex_path, a=True)
+        elif self.mars.permit_timeout:
+            self.mars(asm_path=asm_path, hex_path=hex_path, a=True)
+            self.mars(asm_path=asm_path, out_path=ans_path)
+        else:
+            self.mars(asm_path=asm_path, out_path=ans_path, hex_path=hex_path)
+
+        image = HexImage.load(hex_path)
+        image.handler = self.handler
+        if key is not None:
+            self.cache.put(key, image.text, ans_path)
+        return image
+
+    def run_reference(self, asm_path, hex_path, ans_path):
+        data_path = hex_path[:-len('.text')] + '.data'
+        for path in (hex_path, data_path):
+            if os.path.exists(path):
+                os.remove(path)
+        try:
+            self.mars(asm_path=asm_path, hex_path=hex_path, a=True, data_hex_path=data_path)
+        except SegmentNotFoundError:
+            # an empty .data is fine as long as .text got dumped
+            if not os.path.exists(hex_path):
+                raise
+        data = None
+        if os.path.exists(data_path):
+            with open(data_path, encoding='utf-8') as fp:
+                data = fp.read()
+
+        image = HexImage.load(hex_path)
+        image.handler = self.handler
+        self.reference(image.text, ans_path, data, self.handler, bool(self.mars.db))
+
+        if self.cross_check:
+            expected = Trace()
+            self.mars(asm_path=asm_path, out_path=expected)
+            got = Trace()
+            for rec in self.reference.out:
+                got.push(rec)
+            i = first_mismatch(got, expected)
+            if i is not None:
+                raise CrossCheckFailed('{} disagrees with MARS at line {} on {}: {} vs {}'.format(
+                    self.reference.name, i + 1, asm_path,
+                    render(got[i]) if i < len(got) else 'EOF',
+                    render(expected[i]) if i < len(expected) else 'EOF'))
+        return image
+
     def dump_handler(self, asm_path, hex_path):
         try:
             self.mars(asm_path=asm_path, hex_path=hex_path, a=True,
@@ -51,27 +150,16 @@ class BaseJudge:
         return True
 
     def load_handler(self, asm_path):
-        source = None
-        q = []
-        for runner in self.runners:
-            path = runner.get_handler_hex_path()
-            if path is None:
-                q.append(runner)
-            else:
-                if source is None:
-                    source = path
-                    if not self.dump_handler(asm_path, path):
-                        return False
-                else:
-                    sync_path(source, path)
+        dump_path = os.path.join(self.tmp_dir(), 'handler.text')
+        if not self.dump_handler(asm_path, dump_path):
+            return False
+        with open(dump_path, encoding='utf-8') as fp:
+            self.handler = fp.read()
 
-        if q:
-            if not source:
-                source = os.path.join(self.tmp_dir(), os.path.basename(asm_path) + '.hex')
-                if not self.dump_handler(asm_path, source):
-                    return False
-            for runner in q:
-                runner.set_handler_hex_path(source)
+        for runner in self.runners:
+            if runner.get_handler_hex_path() is None:
+                runner.set_handler_hex_path(os.path.join(self.tmp_dir(), 'handler.hex'))
+            write_atomic(runner.get_handler_hex_path(), self.handler)
 
         print('Loaded handler from', asm_path)
         return True
@@ -80,6 +168,38 @@ class BaseJudge:
         for runner in self.runners:
             runner.stop()
 
+    # runners and MARS by name, for resource accounting
+    def accounted_runners(self):
+        r = {}
+        for runner in list(self.runners) + [self.mars]:
+            name = label = getattr(runner, 'name', runner.__class__.__name__)
+            i = 1
+            while label in r:
+                i += 1
+                label = '{} {}'.format(name, i)
+            r[label] = runner
+        return r
+
+    # what the verdicts depend on besides the cases and the design sources, for resuming a journal
+    def fingerprint(self, handler=True):
+        return md5(repr((self.__class__.__name__, [runner.fingerprint() for runner in self.runners],
+                         self.mars.fingerprint(), self.handler if handler else None,
+                         None if self.reference is None else self.reference.fingerprint(),
+                         self.diff.permit_prefix)).encode()).hexdigest()
+
+    # whether all() should stop, as no design is left to judge the rest of the cases
+    def exhausted(self):
+        return False
+
+    # the stage of the case for the progress reporter of all(), if any
+    def note(self, stage, worker=None, path=None):
+        if self.progress is not None:
+            self.progress.stage(stage, worker, path)
+
+    def record(self, journal, path, verdict):
+        if journal is not None:
+            journal.record(path, verdict, AnswerCache.key(self.mars, path, self.reference, self.handler))
+
     @staticmethod
     def __call__(asm_path):
         raise TypeError
@@ -96,110 +216,277 @@ class BaseJudge:
             on_error=None,
             stop_on_error=True,
             permit_missing_segment=True,
-            reraise=False
+            reraise=False,
+            order=None,
+            history: Optional[History] = None,
+            usage=True,
+            journal=None,
+            resume=False,
+            progress=None
             ):
+        if order is not None:
+            asm_paths = schedule(asm_paths, History() if history is None else history, order)
         total = len(asm_paths)
         cnt = 0
-        for path in asm_paths:
-            try:
-                if self_handler and not self.load_handler(path):
-                    loaded = False
-                    if fallback_handler_asm_path and os.path.exists(fallback_handler_asm_path):
-                        fallback = fallback_handler_asm_path
-                        print('Fallback to handler', fallback)
-                        loaded = self.load_handler(fallback)
-                    if not loaded and fallback_handler_keyword:
-                        dirname = os.path.dirname(os.path.abspath(path))
-                        for fn in os.listdir(dirname):
-                            if fn.endswith('.asm') and fallback_handler_keyword in fn:
-                                fallback = os.path.join(dirname, fn)
-                                print('Fallback to handler', fallback)
-                                loaded = self.load_handler(fallback)
-                                if loaded:
-                                    break
-                    if not loaded:
-                        print('No valid handlers found, keeping the previous one')
-                self(path)
-            except VerificationFailed as e:
-                print('!!', path + ':', e.__class__.__name__, e, file=sys.stderr)
-                if isinstance(e, SegmentNotFoundError) and permit_missing_segment:
-                    print('!! Permitted')
+        if isinstance(journal, str):
+            journal = Journal(journal)
+        elif journal is None and resume:
+            journal = Journal()
+        if journal is not None:
+            # with a handler per case, the one loaded last is no part of the configuration
+            journal.open(self.fingerprint(not self_handler), resume)
+            done = [path for path in asm_paths if journal.completed(path)]
+            if done:
+                cnt = sum(journal.get(path)['verdict'] == PASSED for path in done)
+                print('Resuming from {}: {} of {} cases done'.format(journal.fn, len(done), total))
+                asm_paths = [path for path in asm_paths if not journal.completed(path)]
+        runners = self.accounted_runners()
+        progress = self.progress = Progress.of(progress)
+        if progress is not None:
+            progress.start(asm_paths, history)
+        begin = {name: runner.accounting.mark() for name, runner in runners.items()}
+        case_usage = {}
+        try:
+            for i, path in enumerate(asm_paths):
+                if self.exhausted():
+                    print('!! Stopping with {} cases left, as nothing is left to judge them'.format(
+                        len(asm_paths) - i), file=sys.stderr)
+                    break
+                start = time.perf_counter()
+                marks = {name: runner.accounting.mark() for name, runner in runners.items()}
+                timeouts = sum(runner.timeouts for runner in runners.values())
+                verdict = None
+                if progress is not None:
+                    progress.begin(path)
+                try:
+                    if self_handler and not self.load_handler(path):
+                        loaded = False
+                        if fallback_handler_asm_path and os.path.exists(fallback_handler_asm_path):
+                            fallback = fallback_handler_asm_path
+                            print('Fallback to handler', fallback)
+                            loaded = self.load_handler(fallback)
+                        if not loaded and fallback_handler_keyword:
+                            dirname = os.path.dirname(os.path.abspath(path))
+                            for fn in os.listdir(dirname):
+                                if fn.endswith('.asm') and fallback_handler_keyword in fn:
+                                    fallback = os.path.join(dirname, fn)
+                                    print('Fallback to handler', fallback)
+                                    loaded = self.load_handler(fallback)
+                                    if loaded:
+                                        break
+                        if not loaded:
+                            print('No valid handlers found, keeping the previous one')
+                    self(path)
+                except VerificationFailed as e:
+                    print('!!', path + ':', e.__class__.__name__, e, file=sys.stderr)
+                    if isinstance(e, SegmentNotFoundError) and permit_missing_segment:
+                        print('!! Permitted')
+                        verdict = PERMITTED
+                        self.record(journal, path, PERMITTED)
+                    else:
+                        if history is not None:
+                            history.record(path, FAILED, time.perf_counter() - start)
+                        verdict = FAILED
+                        self.record(journal, path, FAILED)
+                        if on_error:
+                            on_error(path)
+                        if reraise:
+                            raise e
+                        if stop_on_error:
+                            self.stop()
+                            break
                 else:
-                    if on_error:
-                        on_error(path)
-                    if reraise:
-                        raise e
-                    if stop_on_error:
-                        return self.stop()
-            else:
-                cnt += 1
-                print('{}/{}'.format(cnt, total), path, 'ok')
-                if on_success:
-                    on_success(path)
+                    if history is not None:
+                        history.record(path, PASSED, time.perf_counter() - start)
+                    verdict = PASSED
+                    self.record(journal, path, PASSED)
+                    cnt += 1
+                    print('{}/{}'.format(cnt, total), path, 'ok')
+                    if on_success:
+                        on_success(path)
+                finally:
+                    case_usage[path] = {name: runner.accounting.since(marks[name]) for name, runner in runners.items()}
+                    if progress is not None and verdict is not None:
+                        if verdict == PASSED and sum(runner.timeouts for runner in runners.values()) > timeouts:
+                            verdict = TIMED_OUT
+                        progress.end(path, verdict)
+        finally:
+            if progress is not None:
+                progress.stop()
+            self.progress = None
+        if usage:
+            report_usage({name: runner.accounting.since(begin[name]) for name, runner in runners.items()}, case_usage)
 
 
 common_tmp = TmpDir(tmp_pre)
-def get_paths(asm_path):
+def get_paths(asm_path, pre=None):
     base = os.path.basename(asm_path)
-    pre = common_tmp()
+    if pre is None:
+        pre = common_tmp()
     return base, os.path.join(pre, base + '.out'), os.path.join(pre, base + '.ans')
 
 
 class MarsJudge(BaseJudge):
     def __init__(self, runner: BaseHexRunner, mars: Mars,
-                 diff: Optional[Diff] = None):
-        super().__init__([runner], mars, diff)
+                 diff: Optional[Diff] = None, cache: Optional[AnswerCache] = None,
+                 staging: Optional[Staging] = None):
+        super().__init__([runner], mars, diff, cache, staging)
         self.runner = runner
 
     def __call__(self, asm_path):
-        base, out_path, ans_path = get_paths(asm_path)
+        base, out_path, ans_path = self.get_paths(asm_path)
         hex_path = self.get_hex_path(self.runner, base)
+        out_path = self.diff.sink(out_path)
+        ans_path = self.diff.sink(ans_path)
 
-        if self.mars.permit_timeout:
-            self.mars(asm_path=asm_path, hex_path=hex_path, a=True)
-            self.mars(asm_path=asm_path, out_path=ans_path)
-        else:
-            self.mars(asm_path=asm_path, out_path=ans_path, hex_path=hex_path)
+        self.run_mars(asm_path, ans_path).put(self.runner, hex_path)
 
         print('Running simulation for', asm_path, '...')
+        self.note('simulation')
         self.runner(out_path)
+        self.note('diff')
         self.diff(out_path, ans_path)
 
 
-def is_path_same(path1, path2):
-    return os.path.relpath(path1, path2) == '.'
-
-
 class DuetJudge(BaseJudge):
     def __init__(self, runner: BaseHexRunner, runner_std: BaseHexRunner, mars: Mars,
-                 diff: Optional[Diff] = None):
-        super().__init__([runner, runner_std], mars, diff)
+                 diff: Optional[Diff] = None, cache: Optional[AnswerCache] = None,
+                 staging: Optional[Staging] = None):
+        super().__init__([runner, runner_std], mars, diff, cache, staging)
         self.runner = runner
         self.runner_std = runner_std
 
     def __call__(self, asm_path):
-        base, out_path, ans_path = get_paths(asm_path)
+        base, out_path, ans_path = self.get_paths(asm_path)
         hex_path = self.get_hex_path(self.runner, base)
         hex_std_path = self.get_hex_path(self.runner_std, base)
+        out_path = self.diff.sink(out_path)
+        ans_path = self.diff.sink(ans_path)
 
-        self.mars(asm_path=asm_path, hex_path=hex_path, a=True)
-        sync_path(hex_path, hex_std_path)
+        image = self.run_mars(asm_path)
+        image.put(self.runner, hex_path)
+        image.put(self.runner_std, hex_std_path)
 
         print('Running standard simulation for', asm_path, '...')
+        self.note('standard simulation')
         self.runner_std(ans_path)
 
         print('Running simulation for', asm_path, '...')
+        self.note('simulation')
         self.runner(out_path)
 
+        self.note('diff')
         self.diff(out_path, ans_path)
 
 
+class DesignsFailed(VerificationFailed):
+    pass
+
+
+def link_or_copy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+
+class FanOutJudge(BaseJudge):
+    def __init__(self, runners: List[BaseHexRunner], mars: Mars,
+                 diff: Optional[Diff] = None, cache: Optional[AnswerCache] = None,
+                 staging: Optional[Staging] = None,
+                 names: Optional[List[str]] = None,
+                 drop_failed=True):
+        super().__init__(runners, mars, diff, cache, staging)
+        self.names = [str(i) for i in range(len(runners))] if names is None else list(names)
+        self.drop_failed = drop_failed
+        # designs often share file names, such as the circuit Logisim copies into its tmp dir
+        for runner, name in zip(runners, self.names):
+            runner.set_tmp_dir(TmpDir(os.path.join(self.tmp_dir.path, name)))
+        self.active = list(range(len(runners)))
+        self.matrix = {}
+
+    def run_design(self, i, asm_path, image, ans):
+        runner = self.runners[i]
+        base, out_path, ans_path = self.get_paths(asm_path)
+        name = '{}.{}'.format(base, self.names[i])
+        hex_path = self.get_hex_path(runner, name)
+        out_path = self.diff.sink(out_path[:-len('.out')] + '.' + self.names[i] + '.out')
+        ans_path = ans_path[:-len('.ans')] + '.' + self.names[i] + '.ans'
+        # every design gets its own name for the answer, as Diff removes or moves it
+        if isinstance(ans, Trace):
+            ans_path = Trace(ans_path)
+            ans_path.a = ans.a
+        else:
+            link_or_copy(ans, ans_path)
+
+        image.put(runner, hex_path)
+        print('Running simulation of', self.names[i], 'for', asm_path, '...')
+        self.note('simulation', self.names[i], asm_path)
+        try:
+            runner(out_path)
+            self.note('diff', self.names[i])
+            self.diff(out_path, ans_path)
+        except (VerificationFailed, RuntimeError) as e:
+            return '{}: {}'.format(e.__class__.__name__, e)
+        finally:
+            self.note(None, self.names[i])
+        return None
+
+    def __call__(self, asm_path):
+        if self.exhausted():
+            raise DesignsFailed('no design is left, all of them failed before')
+        verdicts = self.matrix[asm_path] = {}
+
+        _, _, ans_path = self.get_paths(asm_path)
+        ans = self.diff.sink(ans_path)
+        image = self.run_mars(asm_path, ans)
+
+        self.note('designs')
+        threads = {}
+        for i in self.active:
+            threads[i] = t = PropagatingThread(target=self.run_design, args=(i, asm_path, image, ans))
+            t.start()
+        failed = []
+        for i, t in threads.items():
+            err = t.join()
+            verdicts[self.names[i]] = 'ok' if err is None else err
+            if err is not None:
+                failed.append(i)
+        if not isinstance(ans, Trace):
+            os.remove(ans)
+
+        if failed:
+            if self.drop_failed:
+                self.active = [i for i in self.active if i not in failed]
+            raise DesignsFailed('; '.join('{} {}'.format(self.names[i], verdicts[self.names[i]]) for i in failed))
+
+    def exhausted(self):
+        return not self.active
+
+    def all(self, asm_paths, stop_on_error=False, **kw):
+        r = super().all(asm_paths, stop_on_error=stop_on_error, **kw)
+        self.report()
+        return r
+
+    def report(self, file=sys.stdout):
+        for i, name in enumerate(self.names):
+            cnt = sum(1 for v in self.matrix.values() if v.get(name) == 'ok')
+            total = sum(1 for v in self.matrix.values() if name in v)
+            state = '' if i in self.active else ', dropped'
+            print('{}: {}/{} passed{}'.format(name, cnt, total, state), file=file)
+
+
 class DummyJudge(MarsJudge):
     def __call__(self, asm_path):
-        base, out_path, _ = get_paths(asm_path)
+        base, out_path, _ = self.get_paths(asm_path)
         hex_path = self.get_hex_path(self.runner, base)
 
-        self.mars(asm_path=asm_path, hex_path=hex_path, a=True)
+        self.run_mars(asm_path).put(self.runner, hex_path)
         print('Running simulation for', asm_path, '...')
+        self.note('simulation')
         self.runner(out_path)
+        if self.staging is not None:
+            out_path = self.staging.persist(out_path)
         print('Output to', out_path)
@@ -0,0 +1,121 @@
+import os, sys, subprocess, threading, tempfile
+
+from .utils import TmpDir, hash_file
+
+cds_dir_default = os.path.join('tmp', 'cds')
+
+
+# secs from launching a JVM to its first output byte, or to its exit if it prints nothing, which is
+# the start-up latency rather than the whole run; kept with and without a profile, to compare the two
+class LaunchStats:
+    def __init__(self):
+        self.n = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+        self.mutex = threading.Lock()
+
+    def add(self, t):
+        with self.mutex:
+            self.n += 1
+            self.total += t
+            self.min = t if self.min is None else min(self.min, t)
+            self.max = t if self.max is None else max(self.max, t)
+
+    def __str__(self):
+        if not self.n:
+            return 'no launches'
+        return '{} launches, mean {:.3f}s, min {:.3f}s, max {:.3f}s'.format(
+            self.n, self.total / self.n, self.min, self.max)
+
+
+class JvmProfile:
+    cds_support = {}
+    cds_mutex = threading.Lock()
+
+    def __init__(self, tiered_stop_at_level=1, heap=None, serial_gc=True,
+                 cds=True, cds_dir=cds_dir_default, extra_flags=()):
+        self.tiered_stop_at_level = tiered_stop_at_level
+        self.heap = heap
+        self.serial_gc = serial_gc
+        self.cds = cds
+        self.cds_dir = TmpDir(cds_dir)
+        self.extra_flags = list(extra_flags)
+
+        self.archives = {}
+        self.pending = {}
+        self.mutex = threading.Lock()
+
+    @classmethod
+    def of(cls, jvm):
+        if not jvm:
+            return None
+        if jvm is True:
+            return cls()
+        if isinstance(jvm, dict):
+            return cls(**jvm)
+        return jvm
+
+    @classmethod
+    def supports_cds(cls, java_path):
+        with cls.cds_mutex:
+            r = cls.cds_support.get(java_path)
+            if r is None:
+                # dynamic archives need JDK 13+, older JVMs reject the option and exit with an error
+                archive = os.path.join(tempfile.gettempdir(), 'probe-{}.jsa'.format(os.getpid()))
+                try:
+                    r = subprocess.run([java_path, '-XX:ArchiveClassesAtExit=' + archive, '-version'],
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+                except OSError:
+                    r = False
+                if os.path.exists(archive):
+                    os.remove(archive)
+                if not r:
+                    print('Warning: class data sharing is not supported by', java_path, file=sys.stderr)
+                cls.cds_support[java_path] = r
+            return r
+
+    def flags(self):
+        r = []
+        if self.tiered_stop_at_level is not None:
+            r += ['-XX:+TieredCompilation', '-XX:TieredStopAtLevel={}'.format(self.tiered_stop_at_level)]
+        if self.heap:
+            r += ['-Xms' + self.heap, '-Xmx' + self.heap]
+        if self.serial_gc:
+            r.append('-XX:+UseSerialGC')
+        return r + self.extra_flags
+
+    def cds_flags(self, java_path, jar_path):
+        if not self.cds or not self.supports_cds(java_path):
+            return []
+        with self.mutex:
+            archive = self.archives.get(jar_path)
+            if archive is None:
+                name = os.path.splitext(os.path.basename(jar_path))[0]
+                archive = os.path.join(self.cds_dir(), '{}-{}.jsa'.format(name, hash_file(jar_path)))
+                self.archives[jar_path] = archive
+            if os.path.exists(archive):
+                return ['-XX:SharedArchiveFile=' + archive, '-Xshare:auto']
+            if jar_path in self.pending:
+                return []
+            # dump into a private file first, so that a killed launch never leaves a partial archive behind
+            tmp = '{}.{}.tmp'.format(archive, os.getpid())
+            self.pending[jar_path] = tmp
+            return ['-XX:ArchiveClassesAtExit=' + tmp]
+
+    def command(self, java_path, jar_path):
+        return [java_path] + self.flags() + self.cds_flags(java_path, jar_path) + ['-jar', jar_path]
+
+    def done(self, jar_path):
+        with self.mutex:
+            tmp = self.pending.pop(jar_path, None)
+            if tmp and os.path.exists(tmp):
+                os.replace(tmp, self.archives[jar_path])
+                print('Created class data sharing archive', self.archives[jar_path])
+
+
+def report_launches(runner, file=sys.stdout):
+    if runner.launches.n:
+        print('{} JVM launch latency with {}: {}'.format(runner.__class__.__name__,
+                                                         'the fast profile' if runner.jvm else 'default flags',
+                                                         runner.launches), file=file)
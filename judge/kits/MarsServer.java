@@ -0,0 +1,110 @@
+import java.io.BufferedReader;
+import java.io.FilterOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.security.Permission;
+
+// Keeps one JVM running mars.MarsLaunch for many programs, driven by judge/mars_server.py.
+// Each request is a line of MARS arguments separated by tabs. The reply is the output of MARS,
+// followed by a line of SENTINEL, "done" and the exit code MARS asked for.
+public class MarsServer {
+    static final String SENTINEL = "\u0001mars-server";
+
+    static class ExitTrapped extends SecurityException {
+        final int status;
+
+        ExitTrapped(int status) {
+            super("exit " + status);
+            this.status = status;
+        }
+    }
+
+    // remembers whether the output so far ends a line, so that the sentinel can always start one
+    static class LineTracker extends FilterOutputStream {
+        boolean atLineStart = true;
+
+        LineTracker(OutputStream out) {
+            super(out);
+        }
+
+        @Override
+        public void write(int b) throws IOException {
+            out.write(b);
+            atLineStart = b == '\n';
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) throws IOException {
+            out.write(b, off, len);
+            if (len > 0) {
+                atLineStart = b[off + len - 1] == '\n';
+            }
+        }
+    }
+
+    static void reset() {
+        mars.Globals.memory.clear();
+        mars.mips.hardware.RegisterFile.resetRegisters();
+        mars.mips.hardware.Coprocessor0.resetRegisters();
+        mars.mips.hardware.Coprocessor1.resetRegisters();
+    }
+
+    public static void main(String[] args) throws Exception {
+        LineTracker tracker = new LineTracker(System.out);
+        PrintStream out = new PrintStream(tracker);
+        System.setOut(out);
+        try {
+            // MarsLaunch ends with System.exit, which is turned into an exception here
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkPermission(Permission perm, Object context) {
+                }
+
+                @Override
+                public void checkExit(int status) {
+                    throw new ExitTrapped(status);
+                }
+            });
+        } catch (UnsupportedOperationException | SecurityException e) {
+            out.println(SENTINEL + " unsupported " + e);
+            out.flush();
+            return;
+        }
+        out.println(SENTINEL + " ready");
+        out.flush();
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in));
+        String line;
+        boolean first = true;
+        while ((line = in.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            int status = 0;
+            try {
+                if (!first) {
+                    reset();
+                }
+                first = false;
+                new mars.MarsLaunch(line.split("\t"));
+            } catch (ExitTrapped e) {
+                status = e.status;
+            } catch (Throwable e) {
+                out.println("MARS server error: " + e);
+                status = 1;
+            }
+            out.flush();
+            if (!tracker.atLineStart) {
+                out.println();
+            }
+            out.println(SENTINEL + " done " + status);
+            out.flush();
+        }
+    }
+}
@@ -2,6 +2,9 @@ import os, os.path, string
 import xml.etree.ElementTree as ET
 
 from .base import BaseHexRunner, VerificationFailed
+from .trace import KIND_REG, KIND_MEM, render
+from .jvm import JvmProfile, LaunchStats
+from .image import write_atomic
 
 pc_width_default = 32
 pc_by_word_default = False
@@ -49,26 +52,29 @@ class LogLine:
     def take_hex(self, n, by_word=False):
         return to_hex(self.take(n, by_word))
 
-    def parse(self,
-              pc_width=pc_width_default,
-              pc_by_word=pc_by_word_default,
-              pc_start=pc_start_default,
-              dma_width=dma_width_default,
-              dma_by_word=dma_by_word_default
-              ):
-        pc = to_hex(0x3000 - pc_start + self.take(pc_width, pc_by_word))
+    def parse_record(self,
+                     pc_width=pc_width_default,
+                     pc_by_word=pc_by_word_default,
+                     pc_start=pc_start_default,
+                     dma_width=dma_width_default,
+                     dma_by_word=dma_by_word_default
+                     ):
+        pc = (0x3000 - pc_start + self.take(pc_width, pc_by_word)) & 0xffffffff
         gw = self.take(1)
-        ga_int = self.take(5)
-        ga = to_dec(ga_int)
-        gd = self.take_hex(32)
-        if gw and ga_int:
-            return '@{}: ${} <= {}'.format(pc, ga, gd)
+        ga = self.take(5)
+        gd = self.take(32)
+        if gw and ga:
+            return pc, KIND_REG, ga, gd
 
         if self.take(1):
-            da = self.take_hex(dma_width, dma_by_word)
-            return '@{}: *{} <= {}'.format(pc, da, self.take_hex(32))
+            da = self.take(dma_width, dma_by_word)
+            return pc, KIND_MEM, da, self.take(32)
         return None
 
+    def parse(self, *args):
+        r = self.parse_record(*args)
+        return None if r is None else render(r)
+
 
 def gen(circ_path, hex_path, im_circ_name, tmp_dir):
     tree = ET.parse(circ_path)
@@ -92,8 +98,7 @@ def gen(circ_path, hex_path, im_circ_name, tmp_dir):
         hex = fp.read()
 
     image_path = os.path.join(tmp_dir, os.path.splitext(os.path.basename(hex_path))[0] + '-image.hex')
-    with open(image_path, 'w', encoding='utf-8') as fp:
-        fp.write('v2.0 raw\n' + hex)
+    write_atomic(image_path, 'v2.0 raw\n' + hex)
 
     instrs = []
     for s in hex.splitlines():
@@ -118,7 +123,7 @@ def gen(circ_path, hex_path, im_circ_name, tmp_dir):
     cont.text = '\n'.join(lines) + '\n'
 
     new_circ_path = os.path.join(tmp_dir, os.path.basename(circ_path))
-    tree.write(new_circ_path)
+    write_atomic(new_circ_path, ET.tostring(root))
     return new_circ_path
 
 
@@ -137,6 +142,7 @@ class Logisim(BaseHexRunner):
                  dma_width=dma_width_default,
                  dma_by_word=dma_by_word_default,
                  im_circuit_name=None,
+                 jvm=None,
                  **kw
                  ):
         super().__init__(**kw)
@@ -144,6 +150,8 @@ class Logisim(BaseHexRunner):
         self.circ_path = circ_path
         self.logisim_path = logisim_path
         self.java_path = java_path
+        self.jvm = JvmProfile.of(jvm)
+        self.launches = LaunchStats()
 
         self.im_circ_name = im_circuit_name
         self.pc_width = pc_width
@@ -152,11 +160,15 @@ class Logisim(BaseHexRunner):
         self.dma_width = dma_width
         self.dma_by_word = dma_by_word
 
-    def parse(self, s):
+    def fingerprint(self):
+        return super().fingerprint() + (self.circ_path, self.im_circ_name, self.pc_width, self.pc_by_word,
+                                         self.pc_start, self.dma_width, self.dma_by_word)
+
+    def parse_record(self, s):
         if not s:
             return
         try:
-            r = LogLine(s).parse(
+            r = LogLine(s).parse_record(
                 self.pc_width, self.pc_by_word, self.pc_start,
                 self.dma_width, self.dma_by_word
             )
@@ -164,6 +176,10 @@ class Logisim(BaseHexRunner):
             raise VerificationFailed('invalid output ({}): {}'.format(e, s)) from e
         return r
 
+    def parse(self, s):
+        r = self.parse_record(s)
+        return None if r is None else render(r)
+
     def set_hex_path(self, path):
         self._set_hex_path(path)
 
@@ -172,7 +188,15 @@ class Logisim(BaseHexRunner):
             circ_path = gen(self.circ_path, self.get_hex_path(), self.im_circ_name, self.tmp_dir())
         except ValueError as e:
             raise IllegalCircuit(e) from e
-        self._communicate([self.java_path, '-jar', self.logisim_path, circ_path, '-tty', 'table'],
-                          out_path,
-                          'maybe the halt pin is set incorrectly, see ' + out_path
-                          )
+        if self.jvm:
+            cmd = self.jvm.command(self.java_path, self.logisim_path)
+        else:
+            cmd = [self.java_path, '-jar', self.logisim_path]
+        try:
+            self._communicate(cmd + [circ_path, '-tty', 'table'],
+                              out_path,
+                              'maybe the halt pin is set incorrectly, see {}'.format(out_path)
+                              )
+        finally:
+            if self.jvm:
+                self.jvm.done(self.logisim_path)
@@ -1,5 +1,9 @@
-import os, subprocess
-from .base import BaseRunner, VerificationFailed
+import os, sys, subprocess, time
+from .base import BaseRunner, VerificationFailed, handle_output
+from .accounting import Usage
+from .jvm import JvmProfile, LaunchStats
+from .mars_server import MarsServer
+from .session import SessionCrashed, SessionTimeout
 
 mars_path_default = os.path.join(os.path.dirname(__file__), 'kits', 'marsx.jar')
 
@@ -19,10 +23,17 @@ def render_arg(name, value, fallback=''):
 class Mars(BaseRunner):
     name = 'MARS'
 
-    def __init__(self, mars_path=None, java_path='java', db=False, np=False, a=False, **kw):
+    def __init__(self, mars_path=None, java_path='java', db=False, np=False, a=False, jvm=None,
+                 server=False, **kw):
         super().__init__(**kw)
         self.mars_path = mars_path_default if mars_path is None else mars_path
         self.java_path = java_path
+        self.jvm = JvmProfile.of(jvm)
+        self.launches = LaunchStats()
+        self.server = None
+        if server:
+            self.server = MarsServer(java_path, self.mars_path, self.jvm, self.cwd, self.env,
+                                     **(server if isinstance(server, dict) else {}))
         self.db = render_arg('db', db)
         self.np = render_arg('np', np)
         self.a = render_arg('a', a)
@@ -33,6 +44,10 @@ class Mars(BaseRunner):
     def set_assemble_only(self):
         self.a = 'a'
 
+    # options that affect the dumped hex or the trace, for keying cached answers
+    def fingerprint(self):
+        return self.mars_path, self.db, self.np, self.a
+
     @staticmethod
     def parse(s):
         sl = s.lower()
@@ -48,14 +63,53 @@ class Mars(BaseRunner):
     def start(self, asm_path):
         subprocess.run([self.java_path, '-jar', self.mars_path, asm_path])
 
-    def __call__(self, asm_path, out_path=None, hex_path=None, a=False, dump_segment='.text'):
-        cmd = [self.java_path, '-jar', self.mars_path, asm_path,
-               'nc',
-               self.db, self.np, render_arg('a', a, self.a),
-               'mc', 'CompactDataAtZero']
+    def __call__(self, asm_path, out_path=None, hex_path=None, a=False, dump_segment='.text',
+                 data_hex_path=None):
+        args = [asm_path,
+                'nc',
+                self.db, self.np, render_arg('a', a, self.a),
+                'mc', 'CompactDataAtZero']
         if hex_path:
-            cmd += ['dump', dump_segment, 'HexText', hex_path]
+            args += ['dump', dump_segment, 'HexText', hex_path]
+        if data_hex_path:
+            args += ['dump', '.data', 'HexText', data_hex_path]
+        timeout_msg = 'maybe an infinite loop' + (', see {}'.format(out_path) if out_path else '')
+
+        if self.server is not None and self.server.available() and self._serve(args, out_path, timeout_msg):
+            return
 
-        self._communicate(cmd, out_path,
-                          'maybe an infinite loop' + (', see ' + out_path if out_path else '')
-                          )
+        if self.jvm:
+            cmd = self.jvm.command(self.java_path, self.mars_path)
+        else:
+            cmd = [self.java_path, '-jar', self.mars_path]
+        try:
+            self._communicate(cmd + args, out_path, timeout_msg)
+        finally:
+            if self.jvm:
+                self.jvm.done(self.mars_path)
+
+    # run on the long-lived MARS server, returning False if it crashed and the call should be retried
+    def _serve(self, args, out_path, timeout_msg):
+        with self._output(out_path) as fp:
+            handler = self.output_handler(fp)
+            start = time.perf_counter()
+            try:
+                s, status = self.server.request([arg for arg in args if arg], self.timeout)
+            except SessionTimeout as e:
+                handle_output(e.output, fp, handler, raw_output_file=self.raw_output_file)
+                self._timed_out(timeout_msg, e)
+                return True
+            except SessionCrashed:
+                print('Warning: MARS server crashed, retrying with a JVM of its own', file=sys.stderr)
+                return False
+            handle_output(s, fp, handler, raw_output_file=self.raw_output_file)
+        # the CPU time and RSS of the long-lived JVM are not attributable to a call
+        self.accounting.record(Usage(time.perf_counter() - start, output=len(s), n=1))
+        if status:
+            raise RuntimeError('{} returned {}'.format(self.name, status))
+        return True
+
+    def stop(self):
+        super().stop()
+        if self.server is not None:
+            self.server.kill()
@@ -0,0 +1,127 @@
+import os, sys, subprocess, threading
+
+from .session import Session, SessionCrashed, SessionTimeout
+from .utils import TmpDir, hash_file
+
+source_path_default = os.path.join(os.path.dirname(__file__), 'kits', 'MarsServer.java')
+build_dir_default = os.path.join('tmp', 'mars-server')
+
+SENTINEL = b'\x01mars-server'
+start_timeout = 30
+
+
+class ServerUnavailable(Exception):
+    pass
+
+
+# one long-lived JVM running MARS for many requests, respawned after a timeout or a crash
+class MarsServer:
+    def __init__(self, java_path, mars_path, jvm=None, cwd=None, env=None,
+                 javac_path=None, source_path=None, build_dir=build_dir_default):
+        self.java_path = java_path
+        self.mars_path = mars_path
+        self.jvm = jvm
+        self.cwd = cwd
+        self.env = env
+        if javac_path is None:
+            d = os.path.dirname(java_path)
+            javac_path = os.path.join(d, 'javac') if d else 'javac'
+        self.javac_path = javac_path
+        self.source_path = source_path_default if source_path is None else source_path
+        self.build_dir = TmpDir(build_dir)
+
+        self.class_dir = None
+        self.allow_flag = False  # JDK 18+ only installs a security manager with -Djava.security.manager=allow
+        self.broken = None
+        self.session = None
+        self.mutex = threading.Lock()
+        self.spawns = 0
+        self.requests = 0
+
+    def build(self):
+        d = os.path.join(self.build_dir(), '{}-{}'.format(hash_file(self.source_path), hash_file(self.mars_path)))
+        if not os.path.isfile(os.path.join(d, 'MarsServer.class')):
+            os.makedirs(d, exist_ok=True)
+            try:
+                r = subprocess.run([self.javac_path, '-nowarn', '-cp', self.mars_path, '-d', d, self.source_path],
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            except OSError as e:
+                raise ServerUnavailable('cannot run {}: {}'.format(self.javac_path, e))
+            if r.returncode:
+                raise ServerUnavailable('failed to compile {}: {}'.format(
+                    self.source_path, r.stdout.decode(errors='ignore').strip()))
+        self.class_dir = d
+
+    def command(self):
+        cmd = [self.java_path]
+        if self.jvm:
+            cmd += self.jvm.flags()
+        if self.allow_flag:
+            cmd.append('-Djava.security.manager=allow')
+        return cmd + ['-cp', os.pathsep.join((self.mars_path, self.class_dir)), 'MarsServer']
+
+    def _spawn(self):
+        try:
+            session = Session(self.command(), self.cwd, self.env)
+        except OSError as e:
+            raise ServerUnavailable('cannot run {}: {}'.format(self.java_path, e))
+        try:
+            _, line = session.read_until(lambda s: s.startswith(SENTINEL), start_timeout)
+        except (SessionTimeout, SessionCrashed):
+            return b''
+        if line.startswith(SENTINEL + b' ready'):
+            self.session = session
+            self.spawns += 1
+            return None
+        session.kill()
+        return line.strip()
+
+    def start(self):
+        if self.class_dir is None:
+            self.build()
+        r = self._spawn()
+        if r is not None and r.startswith(SENTINEL + b' unsupported') and not self.allow_flag:
+            self.allow_flag = True
+            r = self._spawn()
+        if r is not None:
+            raise ServerUnavailable('MARS server failed to start: {}'.format(r.decode(errors='ignore')))
+
+    def available(self):
+        if self.broken is None and self.session is None:
+            try:
+                self.start()
+            except ServerUnavailable as e:
+                print('Warning: {}, falling back to a JVM per MARS call'.format(e), file=sys.stderr)
+                self.broken = e
+        return self.broken is None
+
+    def kill(self):
+        session, self.session = self.session, None
+        if session is not None:
+            session.kill()
+
+    # run MARS with args, returning its output and exit code, see Session for the exceptions
+    def request(self, args, timeout=None):
+        with self.mutex:
+            if self.session is None:
+                self.start()
+            session = self.session
+            self.requests += 1
+            try:
+                session.send('\t'.join(args) + '\n')
+                # the driver starts a line for the sentinel, but an older build may append it to the output
+                s, line = session.read_until(lambda l: SENTINEL + b' done' in l, timeout)
+            except (SessionTimeout, SessionCrashed):
+                self.session = None
+                raise
+            i = line.index(SENTINEL)
+            return s + line[:i], int(line[i:].split()[-1])
+
+    def close(self):
+        with self.mutex:
+            session, self.session = self.session, None
+            if session is not None:
+                session.close()
+
+    def report(self, file=sys.stdout):
+        print('MARS server: {} requests over {} launches'.format(self.requests, self.spawns), file=file)
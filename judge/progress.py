@@ -0,0 +1,161 @@
+import sys, json, time, threading
+
+from .schedule import History, PASSED, FAILED
+from .journal import PERMITTED
+
+TIMED_OUT = 'timeout'  # passed, but with a permitted timeout
+
+interval_default = 2.0
+
+
+def format_secs(secs):
+    if secs is None:
+        return '?'
+    if secs < 10:
+        return '{:.1f}s'.format(secs)
+    secs = int(secs + 0.5)
+    if secs < 60:
+        return '{}s'.format(secs)
+    if secs < 3600:
+        return '{}m{:02d}s'.format(secs // 60, secs % 60)
+    return '{}h{:02d}m'.format(secs // 3600, secs // 60 % 60)
+
+
+# live progress of all(): the judge only updates counters, and a thread of its own renders them every
+# interval secs, as text or as JSON lines for dashboards, so that rendering never holds up the cases
+class Progress:
+    def __init__(self, mode='text', file=None, interval=interval_default):
+        if mode not in ('text', 'json'):
+            raise ValueError('unknown progress mode {}, expected text or json'.format(mode))
+        self.mode = mode
+        self.file = file  # stderr by default, or a path to write to
+        self.interval = interval
+        self.mutex = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.fp = None
+
+    @classmethod
+    def of(cls, progress):
+        if progress is None or isinstance(progress, Progress):
+            return progress
+        if isinstance(progress, dict):
+            return cls(**progress)
+        return cls(progress)
+
+    def start(self, paths, history=None):
+        if history is None:
+            with History() as history:
+                pass  # only read, for the estimates
+        mean = history.mean_time(paths)
+        with self.mutex:
+            self.total = len(paths)
+            self.done = 0
+            self.tally = {PASSED: 0, TIMED_OUT: 0, FAILED: 0, PERMITTED: 0}
+            # expected secs per case, corrected by how the finished ones compare to their estimates
+            self.estimated = any(history.get(path) for path in paths)
+            self.estimates = {path: history.time(path, mean) for path in paths}
+            self.pending = sum(self.estimates.values())
+            self.finished_estimate = self.finished_actual = 0.
+            self.current = {}  # path -> start
+            self.inflight = {}  # worker -> [path, since, stage, stage since]
+            self.events = []
+            self.begin_time = time.perf_counter()
+        self.fp = open(self.file, 'w', encoding='utf-8') if isinstance(self.file, str) else None
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def begin(self, path):
+        now = time.perf_counter()
+        with self.mutex:
+            self.pending -= self.estimates.get(path, 0.)
+            self.current[path] = now
+            self.inflight[threading.current_thread().name] = [path, now, 'start', now]
+
+    # the stage of the case a worker is on, None once the worker is done with it
+    def stage(self, stage, worker=None, path=None):
+        now = time.perf_counter()
+        worker = threading.current_thread().name if worker is None else worker
+        with self.mutex:
+            if stage is None:
+                self.inflight.pop(worker, None)
+                return
+            e = self.inflight.get(worker)
+            if e is None or (path is not None and e[0] != path):
+                self.inflight[worker] = [path, now, stage, now]
+            else:
+                e[2:] = stage, now
+
+    def end(self, path, verdict):
+        now = time.perf_counter()
+        with self.mutex:
+            start = self.current.pop(path, now)
+            self.done += 1
+            self.tally[verdict] += 1
+            self.finished_estimate += self.estimates.get(path, 0.)
+            self.finished_actual += now - start
+            for worker in [w for w, e in self.inflight.items() if e[0] == path]:
+                del self.inflight[worker]
+            if self.mode == 'json':
+                self.events.append({'event': 'case', 'case': path, 'verdict': verdict,
+                                    'elapsed': round(now - start, 3)})
+
+    def eta(self, now, elapsed):
+        if self.estimated:
+            ratio = self.finished_actual / self.finished_estimate if self.finished_estimate else 1.
+            running = sum(max(self.estimates.get(path, 0.) - (now - start), 0.) for path, start in self.current.items())
+            return (self.pending + running) * ratio
+        if self.done:
+            return (self.total - self.done) * elapsed / self.done
+        return None
+
+    def snapshot(self):
+        now = time.perf_counter()
+        with self.mutex:
+            elapsed = now - self.begin_time
+            eta = self.eta(now, elapsed)
+            return {
+                'done': self.done, 'total': self.total, 'elapsed': round(elapsed, 3),
+                'rate': round(self.done / elapsed, 3) if elapsed > 0 else 0.,
+                'eta': None if eta is None else round(eta, 3),
+                'tally': dict(self.tally),
+                'inflight': [{'worker': worker, 'case': path, 'elapsed': round(now - since, 3),
+                              'stage': stage, 'stage_elapsed': round(now - stage_since, 3)}
+                             for worker, (path, since, stage, stage_since) in self.inflight.items()],
+            }
+
+    def render(self, final=False):
+        fp = self.fp or sys.stderr
+        s = self.snapshot()
+        if self.mode == 'json':
+            with self.mutex:
+                events, self.events = self.events, []
+            for e in events:
+                fp.write(json.dumps(e, ensure_ascii=False) + '\n')
+            fp.write(json.dumps(dict(event='end' if final else 'progress', time=time.time(), **s),
+                                ensure_ascii=False) + '\n')
+        else:
+            fp.write('Progress: {}/{}, {:.2f} cases/s, {} {}; ok {}, timed out {}, failed {}, permitted {}\n'.format(
+                s['done'], s['total'], s['rate'], 'took' if final else 'ETA',
+                format_secs(s['elapsed'] if final else s['eta']),
+                *(s['tally'][k] for k in (PASSED, TIMED_OUT, FAILED, PERMITTED))))
+            for e in s['inflight']:
+                fp.write('  {}: {} for {}, {} for {}\n'.format(e['worker'], e['case'], format_secs(e['elapsed']),
+                                                             e['stage'], format_secs(e['stage_elapsed'])))
+        fp.flush()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.render()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+        self.render(final=True)
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
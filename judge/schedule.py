@@ -0,0 +1,130 @@
+import os, json, threading
+from hashlib import md5
+
+history_fn_default = 'history.json'
+
+PASSED = 'ok'
+FAILED = 'failed'
+
+decay = 0.5  # weight of the latest timing in the running average
+
+
+# the content hash of a case, kept in its history entry so that nodes with the cases under other roots find it
+def digest(path):
+    with open(path, 'rb') as fp:
+        return md5(fp.read()).hexdigest()
+
+
+class History:
+    def __init__(self, fn=history_fn_default):
+        self.fn = fn
+        self.d = {}
+        self.changed = False
+        self.mutex = threading.Lock()
+
+    # relative to the working directory with forward slashes, so that the history survives moving the checkout
+    @staticmethod
+    def key(path):
+        try:
+            path = os.path.relpath(path)
+        except ValueError:
+            path = os.path.abspath(path)  # on another drive
+        return os.path.normcase(path).replace(os.sep, '/')
+
+    def __enter__(self):
+        try:
+            with open(self.fn, encoding='utf-8') as fp:
+                d = json.load(fp)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            d = {}
+        # histories written with absolute keys
+        self.d = {self.key(k) if os.path.isabs(k) else k: e for k, e in d.items()}
+        return self
+
+    def close(self):
+        with self.mutex:
+            if self.changed:
+                with open(self.fn, 'w', encoding='utf-8') as fp:
+                    json.dump(self.d, fp, ensure_ascii=False, indent=4, separators=(',', ': '))
+                self.changed = False
+
+    def __exit__(self, t, v, tb):
+        self.close()
+
+    def get(self, path):
+        return self.d.get(self.key(path))
+
+    def record(self, path, verdict, elapsed):
+        try:
+            h = digest(path)
+        except OSError:
+            h = None
+        with self.mutex:
+            e = self.d.setdefault(self.key(path), {'runs': 0, 'fails': 0, 'time': elapsed})
+            if h is not None:
+                e['digest'] = h
+            e['runs'] += 1
+            if verdict == FAILED:
+                e['fails'] += 1
+            e['time'] = e['time'] * (1 - decay) + elapsed * decay
+            e['last'] = verdict
+            self.changed = True
+
+    def by_digest(self):
+        with self.mutex:
+            return {e['digest']: e for e in self.d.values() if 'digest' in e}
+
+    def time(self, path, fallback=None):
+        e = self.get(path)
+        return fallback if e is None else e['time']
+
+    def mean_time(self, paths):
+        ts = [e['time'] for e in map(self.get, paths) if e]
+        return sum(ts) / len(ts) if ts else 1.0
+
+    def failure_rate(self, path):
+        e = self.get(path)
+        if e is None:
+            return 0.5
+        p = (e['fails'] + 1) / (e['runs'] + 2)
+        if e.get('last') == FAILED:
+            p = (p + 1) / 2
+        return p
+
+
+def failed_first(paths, history):
+    return sorted(paths, key=lambda p: (history.get(p) or {}).get('last') != FAILED)
+
+
+def shortest_first(paths, history):
+    t = history.mean_time(paths)
+    return sorted(paths, key=lambda p: history.time(p, t))
+
+
+# probability of failure per second, so a broken build fails as early as possible
+def fail_rate(paths, history):
+    t = history.mean_time(paths)
+    return sorted(paths, key=lambda p: -history.failure_rate(p) / max(history.time(p, t), 1e-3))
+
+
+policies = {
+    'failed-first': failed_first,
+    'shortest-first': shortest_first,
+    'fail-rate': fail_rate,
+}
+
+
+# i/n of the command line, from 1, as an index from 0 and a count
+def parse_shard(s):
+    i, n = map(int, s.split('/'))
+    if not 1 <= i <= n:
+        raise ValueError('shard {} out of range'.format(s))
+    return i - 1, n
+
+
+def schedule(paths, history, order):
+    if order is None or order == 'glob':
+        return list(paths)
+    if callable(order):
+        return order(paths, history)
+    return policies[order](paths, history)
@@ -0,0 +1,68 @@
+import os, subprocess, threading, queue, time
+
+from .utils import kill_group
+
+
+class SessionCrashed(Exception):
+    def __init__(self, output):
+        super().__init__('session exited unexpectedly')
+        self.output = output
+
+
+class SessionTimeout(Exception):
+    def __init__(self, output):
+        super().__init__('session timed out')
+        self.output = output
+
+
+# a long-lived child talking in lines over stdin/stdout, with its stdout drained by a thread
+class Session:
+    def __init__(self, cmd, cwd=None, env=None):
+        kw = {'start_new_session': True} if os.name != 'nt' else {}
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     cwd=cwd, env=env, **kw)
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in iter(self.proc.stdout.readline, b''):
+            self.lines.put(line)
+        self.lines.put(None)
+
+    def send(self, s):
+        try:
+            self.proc.stdin.write(s.encode() if isinstance(s, str) else s)
+            self.proc.stdin.flush()
+        except OSError:
+            self.kill()
+            raise SessionCrashed(b'')
+
+    # collect output up to a line for which done() holds, returning the output and that line
+    def read_until(self, done, timeout=None):
+        out = []
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            try:
+                line = self.lines.get(timeout=None if deadline is None
+                                      else max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                self.kill()
+                raise SessionTimeout(b''.join(out))
+            if line is None:
+                self.kill()
+                raise SessionCrashed(b''.join(out))
+            if done(line):
+                return b''.join(out), line
+            out.append(line)
+
+    def kill(self):
+        kill_group(self.proc)
+        self.proc.wait()
+
+    def close(self, timeout=1):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        self.kill()
@@ -0,0 +1,412 @@
+from array import array
+
+from .mars import MarsError
+from .trace import KIND_REG, KIND_MEM, render
+
+M = 0xffffffff
+
+text_base = 0x3000
+handler_base = 0x4180
+data_base = 0x0000
+gp_default = 0x1800
+sp_default = 0x2ffc
+max_steps_default = 1 << 22
+
+# segments of the CompactDataAtZero layout that loads and stores may access
+writable = ((0x0000, 0x3000), (0x5000, 0x8000))
+
+EXC_ADEL = 4
+EXC_ADES = 5
+EXC_SYSCALL = 8
+EXC_BREAK = 9
+EXC_RI = 10
+EXC_OV = 12
+
+CP0_SR = 12
+CP0_CAUSE = 13
+CP0_EPC = 14
+EXL = 0x2
+
+NOT_TAKEN = -1
+
+
+class SimulationError(MarsError):
+    pass
+
+
+class CrossCheckFailed(SimulationError):
+    pass
+
+
+class _Trap(Exception):
+    def __init__(self, code, addr=None):
+        self.code = code
+        self.addr = addr
+
+
+class _Exit(Exception):
+    pass
+
+
+class _Return(Exception):
+    def __init__(self, target):
+        self.target = target
+
+
+def signed(x):
+    return x - 0x100000000 if x & 0x80000000 else x
+
+
+def sext16(x):
+    return x - 0x10000 if x & 0x8000 else x
+
+
+def parse_words(text):
+    r = []
+    if text:
+        for line in text.split():
+            r.append(int(line, 16))
+    return r
+
+
+class Simulator:
+    name = 'Simulator'
+
+    def __init__(self, max_steps=max_steps_default, permit_timeout=True):
+        self.max_steps = max_steps
+        self.permit_timeout = permit_timeout
+
+        self.regs = array('I', bytes(4 * 32))
+        self.hilo = array('I', bytes(4 * 2))
+        self.cp0 = array('I', bytes(4 * 32))
+        self.mem = {}  # word address -> word, sparse
+        self.out = []
+        self.decoded = {}  # (word, db) -> closure taking the pc
+
+    def fingerprint(self):
+        return self.name
+
+    def check(self, addr, align, code):
+        if addr & (align - 1):
+            raise _Trap(code, addr)
+        for lo, hi in writable:
+            if lo <= addr < hi:
+                return
+        raise _Trap(code, addr)
+
+    def decode(self, w, db):
+        regs, hilo, cp0, mem, out = self.regs, self.hilo, self.cp0, self.mem, self.out
+        check = self.check
+        emit = out.append
+        op = w >> 26
+        rs = (w >> 21) & 31
+        rt = (w >> 16) & 31
+        rd = (w >> 11) & 31
+        sh = (w >> 6) & 31
+        fn = w & 63
+        imm = w & 0xffff
+        simm = sext16(imm)
+        link = 8 if db else 4
+
+        def wr(r, pc, v):
+            if r:
+                regs[r] = v
+                emit((pc, KIND_REG, r, v))
+
+        def alu(r, f):
+            def g(pc):
+                wr(r, pc, f() & M)
+            return g
+
+        def ov(r, f):
+            def g(pc):
+                v = f()
+                if not -0x80000000 <= v <= 0x7fffffff:
+                    raise _Trap(EXC_OV)
+                wr(r, pc, v & M)
+            return g
+
+        def branch(cond):
+            def g(pc):
+                return (pc + 4 + (simm << 2)) & M if cond() else NOT_TAKEN
+            return g
+
+        def load(size, unsigned):
+            def g(pc):
+                addr = (regs[rs] + simm) & M
+                check(addr, size, EXC_ADEL)
+                v = mem.get(addr >> 2, 0)
+                if size < 4:
+                    bits = size * 8
+                    v = (v >> ((addr & 3) * 8)) & ((1 << bits) - 1)
+                    if not unsigned and v >> (bits - 1):
+                        v = (v - (1 << bits)) & M
+                wr(rt, pc, v)
+            return g
+
+        def store(size):
+            def g(pc):
+                addr = (regs[rs] + simm) & M
+                check(addr, size, EXC_ADES)
+                a = addr >> 2
+                if size == 4:
+                    v = regs[rt]
+                else:
+                    shift = (addr & 3) * 8
+                    mask = ((1 << (size * 8)) - 1) << shift
+                    v = (mem.get(a, 0) & ~mask | (regs[rt] << shift) & mask) & M
+                mem[a] = v
+                emit((pc, KIND_MEM, a << 2, v))
+            return g
+
+        def mult(sign):
+            def g(pc):
+                a, b = regs[rs], regs[rt]
+                if sign:
+                    a, b = signed(a), signed(b)
+                p = a * b
+                hilo[0] = (p >> 32) & M
+                hilo[1] = p & M
+            return g
+
+        def div(sign):
+            def g(pc):
+                a, b = regs[rs], regs[rt]
+                if b == 0:
+                    return
+                if sign:
+                    a, b = signed(a), signed(b)
+                q = abs(a) // abs(b)
+                if (a < 0) != (b < 0):
+                    q = -q
+                hilo[0] = (a - q * b) & M
+                hilo[1] = q & M
+            return g
+
+        if op == 0:
+            if fn == 0:
+                return alu(rd, lambda: regs[rt] << sh)
+            if fn == 2:
+                return alu(rd, lambda: regs[rt] >> sh)
+            if fn == 3:
+                return alu(rd, lambda: signed(regs[rt]) >> sh)
+            if fn == 4:
+                return alu(rd, lambda: regs[rt] << (regs[rs] & 31))
+            if fn == 6:
+                return alu(rd, lambda: regs[rt] >> (regs[rs] & 31))
+            if fn == 7:
+                return alu(rd, lambda: signed(regs[rt]) >> (regs[rs] & 31))
+            if fn == 8:
+                return lambda pc: regs[rs]
+            if fn == 9:
+                def jalr(pc):
+                    t = regs[rs]
+                    wr(rd, pc, (pc + link) & M)
+                    return t
+                return jalr
+            if fn == 12:
+                def syscall(pc):
+                    if regs[2] in (10, 17):
+                        raise _Exit
+                return syscall
+            if fn == 13:
+                def brk(pc):
+                    raise _Trap(EXC_BREAK)
+                return brk
+            if fn == 16:
+                return alu(rd, lambda: hilo[0])
+            if fn == 17:
+                def mthi(pc):
+                    hilo[0] = regs[rs]
+                return mthi
+            if fn == 18:
+                return alu(rd, lambda: hilo[1])
+            if fn == 19:
+                def mtlo(pc):
+                    hilo[1] = regs[rs]
+                return mtlo
+            if fn == 24:
+                return mult(True)
+            if fn == 25:
+                return mult(False)
+            if fn == 26:
+                return div(True)
+            if fn == 27:
+                return div(False)
+            if fn == 32:
+                return ov(rd, lambda: signed(regs[rs]) + signed(regs[rt]))
+            if fn == 33:
+                return alu(rd, lambda: regs[rs] + regs[rt])
+            if fn == 34:
+                return ov(rd, lambda: signed(regs[rs]) - signed(regs[rt]))
+            if fn == 35:
+                return alu(rd, lambda: regs[rs] - regs[rt])
+            if fn == 36:
+                return alu(rd, lambda: regs[rs] & regs[rt])
+            if fn == 37:
+                return alu(rd, lambda: regs[rs] | regs[rt])
+            if fn == 38:
+                return alu(rd, lambda: regs[rs] ^ regs[rt])
+            if fn == 39:
+                return alu(rd, lambda: ~(regs[rs] | regs[rt]))
+            if fn == 42:
+                return alu(rd, lambda: int(signed(regs[rs]) < signed(regs[rt])))
+            if fn == 43:
+                return alu(rd, lambda: int(regs[rs] < regs[rt]))
+        elif op == 1:
+            if rt in (0, 16, 1, 17):
+                less = rt & 1 == 0
+
+                def regimm(pc):
+                    taken = (signed(regs[rs]) < 0) == less
+                    if rt & 16:
+                        wr(31, pc, (pc + link) & M)
+                    return (pc + 4 + (simm << 2)) & M if taken else NOT_TAKEN
+                return regimm
+        elif op in (2, 3):
+            index = (w & 0x3ffffff) << 2
+
+            def jump(pc):
+                if op == 3:
+                    wr(31, pc, (pc + link) & M)
+                return ((pc + 4) & 0xf0000000) | index
+            return jump
+        elif op == 4:
+            return branch(lambda: regs[rs] == regs[rt])
+        elif op == 5:
+            return branch(lambda: regs[rs] != regs[rt])
+        elif op == 6:
+            return branch(lambda: signed(regs[rs]) <= 0)
+        elif op == 7:
+            return branch(lambda: signed(regs[rs]) > 0)
+        elif op == 8:
+            return ov(rt, lambda: signed(regs[rs]) + simm)
+        elif op == 9:
+            return alu(rt, lambda: regs[rs] + simm)
+        elif op == 10:
+            return alu(rt, lambda: int(signed(regs[rs]) < simm))
+        elif op == 11:
+            return alu(rt, lambda: int(regs[rs] < (simm & M)))
+        elif op == 12:
+            return alu(rt, lambda: regs[rs] & imm)
+        elif op == 13:
+            return alu(rt, lambda: regs[rs] | imm)
+        elif op == 14:
+            return alu(rt, lambda: regs[rs] ^ imm)
+        elif op == 15:
+            return alu(rt, lambda: imm << 16)
+        elif op == 16:
+            if rs == 0:
+                return alu(rt, lambda: cp0[rd])
+            if rs == 4:
+                def mtc0(pc):
+                    cp0[rd] = regs[rt]
+                return mtc0
+            if w == 0x42000018:
+                def eret(pc):
+                    cp0[CP0_SR] &= ~EXL & M
+                    raise _Return(cp0[CP0_EPC])
+                return eret
+        elif op == 28 and fn == 2:
+            return alu(rd, lambda: signed(regs[rs]) * signed(regs[rt]))
+        elif op == 32:
+            return load(1, False)
+        elif op == 33:
+            return load(2, False)
+        elif op == 35:
+            return load(4, False)
+        elif op == 36:
+            return load(1, True)
+        elif op == 37:
+            return load(2, True)
+        elif op == 40:
+            return store(1)
+        elif op == 41:
+            return store(2)
+        elif op == 43:
+            return store(4)
+
+        def reserved(pc):
+            raise _Trap(EXC_RI)
+        return reserved
+
+    def reset(self, data):
+        regs = self.regs
+        for i in range(32):
+            regs[i] = 0
+            self.cp0[i] = 0
+        regs[28] = gp_default
+        regs[29] = sp_default
+        self.hilo[0] = self.hilo[1] = 0
+        self.mem.clear()
+        del self.out[:]
+        for i, w in enumerate(data):
+            if w:
+                self.mem[(data_base >> 2) + i] = w
+
+    def run(self, text, data=None, handler=None, db=False):
+        self.reset(parse_words(data))
+        code = {}
+        for i, w in enumerate(parse_words(text)):
+            code[text_base + 4 * i] = w
+        handler_words = parse_words(handler)
+        for i, w in enumerate(handler_words):
+            code[handler_base + 4 * i] = w
+
+        fetch = code.get
+        decoded = self.decoded
+        cp0 = self.cp0
+        pc = text_base
+        npc = pc + 4
+        in_delay = False
+        steps = 0
+        while True:
+            w = fetch(pc)
+            if w is None:
+                break  # dropped off the bottom, as MARS does
+            steps += 1
+            if steps > self.max_steps:
+                return False
+            f = decoded.get((w, db))
+            if f is None:
+                f = decoded[w, db] = self.decode(w, db)
+            try:
+                t = f(pc)
+            except _Trap as e:
+                if not handler_words:
+                    raise SimulationError('exception {} at 0x{:08x} with no handler loaded'.format(e.code, pc))
+                cp0[CP0_EPC] = pc - 4 if in_delay else pc
+                cp0[CP0_CAUSE] = (cp0[CP0_CAUSE] & ~0x8000007c & M) | (e.code << 2) | (in_delay << 31)
+                cp0[CP0_SR] |= EXL
+                pc, npc, in_delay = handler_base, handler_base + 4, False
+                continue
+            except _Return as e:
+                pc, npc, in_delay = e.target, e.target + 4, False
+                continue
+            except _Exit:
+                break
+
+            if t is None:
+                pc, npc, in_delay = npc, npc + 4, False
+            elif db:
+                pc, npc, in_delay = npc, (npc + 4 if t == NOT_TAKEN else t), True
+            elif t == NOT_TAKEN:
+                pc, npc = npc, npc + 4
+            else:
+                pc, npc = t, t + 4
+        return True
+
+    def __call__(self, text, out_path, data=None, handler=None, db=False):
+        finished = self.run(text, data, handler, db)
+        if hasattr(out_path, 'push'):
+            for rec in self.out:
+                out_path.push(rec)
+        elif out_path:
+            with open(out_path, 'w', encoding='utf-8') as fp:
+                for rec in self.out:
+                    fp.write(render(rec) + '\n')
+        if not finished:
+            msg = '{} exceeded {} steps, maybe an infinite loop, see {}'.format(self.name, self.max_steps, out_path)
+            if not self.permit_timeout:
+                raise RuntimeError(msg)
+            print('Permitted:', msg)
@@ -0,0 +1,92 @@
+import os, shutil, time, atexit, tempfile
+
+from .utils import TmpDir
+from .defaults import staging_root_default
+
+persist_dir_default = 'tmp'
+
+
+def dir_size(path):
+    r = 0
+    for root, dirs, files in os.walk(path):
+        for fn in files:
+            try:
+                r += os.path.getsize(os.path.join(root, fn))
+            except OSError:
+                pass
+    return r
+
+
+# remove per-judge directories (tmp/<id>) older than max_age secs, then the oldest ones beyond max_bytes
+def prune(path, max_age=None, max_bytes=None):
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return 0
+    dirs = []
+    for name in names:
+        p = os.path.join(path, name)
+        if name.isdigit() and os.path.isdir(p):
+            dirs.append((os.path.getmtime(p), p))
+    dirs.sort()
+
+    now = time.time()
+    removed = 0
+    kept = []
+    for mtime, p in dirs:
+        if max_age is not None and now - mtime > max_age:
+            shutil.rmtree(p, ignore_errors=True)
+            removed += 1
+        else:
+            kept.append(p)
+
+    if max_bytes is not None:
+        sizes = [dir_size(p) for p in kept]
+        total = sum(sizes)
+        for p, size in zip(kept, sizes):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(p, ignore_errors=True)
+            total -= size
+            removed += 1
+    return removed
+
+
+# prune with a report, whether or not the judge stages its files
+def retain(persist_dir=persist_dir_default, max_age=None, max_bytes=None):
+    if max_age is None and max_bytes is None:
+        return 0
+    removed = prune(persist_dir, max_age, max_bytes)
+    if removed:
+        print('Removed', removed, 'old judge directories from', persist_dir)
+    return removed
+
+
+class Staging:
+    # everything is staged in a private directory under base, which is removed at exit
+    def __init__(self, base=None, persist_dir=persist_dir_default, max_age=None, max_bytes=None):
+        base = staging_root_default if base is None else base
+        self.root = TmpDir(os.path.join(base, 'co-judge-{}'.format(os.getpid())))
+        self.persist_dir = TmpDir(persist_dir)
+        self.dirs = []
+        retain(persist_dir, max_age, max_bytes)
+        atexit.register(self.cleanup)
+
+    def tmp_dir(self, name):
+        r = TmpDir(os.path.join(self.root.path, name))
+        self.dirs.append(r)
+        return r
+
+    def persisted_path(self, path):
+        return os.path.join(self.persist_dir(), os.path.basename(path))
+
+    def persist(self, path):
+        dst = self.persisted_path(path)
+        if os.path.abspath(dst) != os.path.abspath(path):
+            shutil.move(path, dst)
+        return dst
+
+    def cleanup(self):
+        for d in self.dirs:
+            d.cleanup()
+        self.root.cleanup()
@@ -0,0 +1,134 @@
+import re
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+KIND_REG = 0
+KIND_MEM = 1
+
+RECORD_SIZE = 4  # pc, kind, register number or address, data
+CHUNK = 4096  # records compared per slice in the pure Python fallback
+
+magic = b'TRC1'
+
+reg_pattern = re.compile(r'@([0-9a-fA-F]{1,8}): *\$ *(\d+) *<= *([0-9a-fA-F]{1,8})$')
+mem_pattern = re.compile(r'@([0-9a-fA-F]{1,8}): *\*([0-9a-fA-F]{1,8}) *<= *([0-9a-fA-F]{1,8})$')
+
+
+class MalformedTrace(ValueError):
+    pass
+
+
+def parse_text(s):
+    m = reg_pattern.match(s)
+    if m:
+        return int(m[1], 16), KIND_REG, int(m[2]), int(m[3], 16)
+    m = mem_pattern.match(s)
+    if m:
+        return int(m[1], 16), KIND_MEM, int(m[2], 16), int(m[3], 16)
+    raise MalformedTrace('unrecognized trace line: ' + s)
+
+
+def render(rec):
+    pc, kind, addr, data = rec
+    if kind == KIND_REG:
+        return '@{:08x}: ${:2d} <= {:08x}'.format(pc, addr, data)
+    return '@{:08x}: *{:08x} <= {:08x}'.format(pc, addr, data)
+
+
+class Trace:
+    def __init__(self, path=None):
+        self.path = path
+        self.a = array('I')
+        assert self.a.itemsize == 4
+
+    def push(self, rec):
+        self.a.extend(rec)
+
+    def write(self, s):
+        for line in s.splitlines():
+            line = line.strip()
+            if line:
+                self.push(parse_text(line))
+
+    def clear(self):
+        del self.a[:]
+
+    def copy(self):
+        r = Trace(self.path)
+        r.a = array('I', self.a)
+        return r
+
+    def __len__(self):
+        return len(self.a) // RECORD_SIZE
+
+    def __getitem__(self, i):
+        p = i * RECORD_SIZE
+        return tuple(self.a[p:p + RECORD_SIZE])
+
+    def __str__(self):
+        return str(self.path)
+
+    def lines(self, start=0, stop=None):
+        n = len(self)
+        stop = n if stop is None else min(stop, n)
+        for i in range(max(start, 0), stop):
+            yield render(self[i])
+
+    def render_to(self, path, start=0, stop=None):
+        with open(path, 'w', encoding='utf-8') as fp:
+            for line in self.lines(start, stop):
+                fp.write(line + '\n')
+
+    def tobytes(self):
+        return magic + self.a.tobytes()
+
+    @classmethod
+    def frombytes(cls, b, path=None):
+        if b[:len(magic)] != magic:
+            raise MalformedTrace('not a compact trace' + ('' if path is None else ': ' + path))
+        r = cls(path)
+        r.a.frombytes(b[len(magic):])
+        return r
+
+    def save(self, path=None):
+        with open(self.path if path is None else path, 'wb') as fp:
+            fp.write(self.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as fp:
+            return cls.frombytes(fp.read(), path)
+
+
+def _first_mismatch_np(a, b, n):
+    x = np.frombuffer(a, dtype=np.uint32, count=n * RECORD_SIZE).reshape(n, RECORD_SIZE)
+    y = np.frombuffer(b, dtype=np.uint32, count=n * RECORD_SIZE).reshape(n, RECORD_SIZE)
+    neq = (x != y).any(axis=1)
+    i = int(neq.argmax())
+    return i if neq[i] else None
+
+
+def _first_mismatch_py(a, b, n):
+    step = CHUNK * RECORD_SIZE
+    for p in range(0, n * RECORD_SIZE, step):
+        q = min(p + step, n * RECORD_SIZE)
+        if a[p:q] != b[p:q]:
+            for i in range(p, q):
+                if a[i] != b[i]:
+                    return i // RECORD_SIZE
+    return None
+
+
+def first_mismatch(out: Trace, ans: Trace, permit_prefix=False):
+    n = min(len(out), len(ans))
+    if n:
+        i = (_first_mismatch_np if np is not None else _first_mismatch_py)(out.a, ans.a, n)
+        if i is not None:
+            return i
+    if permit_prefix or len(out) == len(ans):
+        return None
+    return n
@@ -1,6 +1,11 @@
-import os, subprocess, glob, threading, json
+import os, subprocess, glob, threading, json, signal, shutil
 from hashlib import md5
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
 
 def try_mkdir(path, func=os.mkdir):
     if not os.path.isdir(path):
@@ -61,6 +66,11 @@ class TmpDir:
             self.created = True
         return self.path
 
+    def cleanup(self):
+        if self.created:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.created = False
+
 
 def hash_file(fn):
     with open(fn, 'rb') as fp:
@@ -76,10 +86,16 @@ def run(cmd, quiet=True):
 
 def kill_pid(pid):
     if os.name != 'nt':
-        raise NotImplementedError
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        return
     run(['taskkill', '/f', '/pid', str(pid)])
 
 
+# every process of an image name on the machine, Windows only: elsewhere kill_group takes down a child with
+# what it spawned, leaving alone the simulators of other judges
 def kill_im(im):
     if os.name != 'nt':
         raise NotImplementedError
@@ -88,6 +104,26 @@ def kill_im(im):
     run(['taskkill', '/f', '/im', im])
 
 
+# kill a child started in its own session together with everything it spawned
+def kill_group(proc):
+    if os.name == 'nt':
+        return proc.kill()
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        proc.kill()
+
+
+# limits like {'cpu': 10, 'as': 1 << 30, 'fsize': 1 << 26}, names of RLIMIT_* in lower case
+def set_limits(limits, pid=None):
+    for name, value in limits.items():
+        res = getattr(resource, 'RLIMIT_' + name.upper())
+        if pid is None:
+            resource.setrlimit(res, (value, value))
+        else:
+            resource.prlimit(pid, res, (value, value))
+
+
 def resolve_paths(paths, recursive=True, use_glob=True, blocklist=None, on_omit=None):
     if isinstance(paths, str):
         r = [paths]
@@ -119,3 +155,41 @@ def resolve_paths(paths, recursive=True, use_glob=True, blocklist=None, on_omit=
             push(path)
 
     return q
+
+
+# the index-th of count shards (from 0), balanced by greedily giving the costliest case to the lightest shard;
+# costs are runtimes in history, found by the content of the case rather than by its path, or asm sizes scaled
+# to them, so every node sharing the history gets the same split wherever it keeps the cases
+def shard(paths, index, count, history=None):
+    if not 0 <= index < count:
+        raise ValueError('shard index {} out of range for {} shards'.format(index, count))
+    sizes = {}
+    digests = {}
+    for path in paths:
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        sizes[path] = len(data)
+        digests[path] = md5(data).hexdigest()
+
+    times = {}
+    if history is not None:
+        by_digest = history.by_digest()
+        for path in paths:
+            e = by_digest.get(digests[path]) or history.get(path)  # entries recorded before the digests
+            if e is not None:
+                times[path] = e['time']
+    # secs per byte of the cases with history, for estimating the others
+    known = sum(sizes[path] for path in times)
+    scale = sum(times.values()) / known if known else 1.0
+
+    def cost(path):
+        return times[path] if path in times else sizes[path] * scale
+
+    loads = [0.] * count
+    mine = set()
+    for path in sorted(paths, key=lambda p: (-cost(p), digests[p], p)):
+        i = min(range(count), key=lambda k: loads[k])
+        loads[i] += cost(path)
+        if i == index:
+            mine.add(path)
+    return [path for path in paths if path in mine]
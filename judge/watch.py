@@ -0,0 +1,104 @@
+import os, time, glob, fnmatch
+
+from .cache import AnswerCache
+from .schedule import History, schedule
+from .utils import resolve_paths
+
+interval_default = 1.0
+
+
+class Watcher:
+    def __init__(self, paths, patterns=None):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.patterns = patterns
+        self.state = self.snapshot()
+
+    def match(self, fn):
+        return self.patterns is None or any(fnmatch.fnmatch(fn, p) for p in self.patterns)
+
+    def snapshot(self):
+        r = {}
+
+        def stat(path):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return
+            r[path] = st.st_mtime_ns, st.st_size
+
+        for path in (p for pattern in self.paths for p in glob.glob(pattern, recursive=True)):
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    for fn in files:
+                        if self.match(fn):
+                            stat(os.path.join(root, fn))
+            else:
+                stat(path)
+        return r
+
+    def poll(self):
+        state = self.snapshot()
+        old = self.state
+        self.state = state
+        return set(p for p in state.keys() | old.keys() if state.get(p) != old.get(p))
+
+
+# judge the cases again whenever the cases or the sources change, the ones failed before and the changed ones
+# first, then the rest in the given order; the other keywords go to all()
+def watch(judge, cases, sources, source_patterns=None,
+          on_change=None, interval=interval_default, order=None, resume=False, **kw):
+    if judge.cache is None:
+        judge.cache = AnswerCache()
+    case_watcher = Watcher(cases, ('*.asm',))
+    source_watcher = Watcher(sources, source_patterns)
+
+    paths = resolve_paths(cases)
+    failed = []
+    changed_cases = set()
+    on_success = kw.pop('on_success', None)
+    on_error = kw.pop('on_error', None)
+
+    def success(path):
+        if path in failed:
+            failed.remove(path)
+        if on_success:
+            on_success(path)
+
+    def error(path):
+        if path not in failed:
+            failed.append(path)
+        if on_error:
+            on_error(path)
+
+    try:
+        while True:
+            first = [p for p in failed if p in paths]
+            first += [p for p in paths if p in changed_cases and p not in first]
+            rest = [p for p in paths if p not in first]
+            if order is not None:
+                history = kw.get('history')
+                rest = schedule(rest, History() if history is None else history, order)
+            print('Judging {} cases ({} failed before, {} changed)'.format(
+                len(paths), len(failed), len(changed_cases)))
+            judge.all(first + rest, on_success=success, on_error=error, resume=resume, **kw)
+            resume = False  # after a change, everything is judged again
+            changed_cases.clear()
+
+            print('Watching for changes ...')
+            while True:
+                changed = case_watcher.poll()
+                sources_changed = source_watcher.poll()
+                if changed or sources_changed:
+                    break
+                time.sleep(interval)
+            if changed:
+                # only rescan the case set when some .asm is added, removed or modified
+                paths = resolve_paths(cases)
+                changed = set(os.path.normpath(p) for p in changed)
+                changed_cases = set(p for p in paths if os.path.normpath(p) in changed)
+            if sources_changed:
+                print('Changed:', ', '.join(sorted(sources_changed)))
+                if on_change:
+                    on_change(sources_changed)
+    except KeyboardInterrupt:
+        judge.stop()
@@ -1,7 +1,8 @@
-import argparse
-from judge.logisim import *
-from judge.base import timeout_default
-from judge import Logisim, Mars, Diff, MarsJudge, INFINITE_LOOP, resolve_paths
+import sys, argparse
+from judge.defaults import timeout_default, INFINITE_LOOP, store_dir_default, answers_dir_default, \
+    staging_root_default
+from judge.schedule import History, policies, history_fn_default, parse_shard
+from judge.journal import journal_fn_default
 
 
 if __name__ == '__main__':
@@ -27,15 +28,13 @@ if __name__ == '__main__':
                         help='name of the circuit containing the ROM to load dumped instructions into, omit to look'
                              ' for any ROM in the project')
     parser.add_argument('--pc-width', metavar='width', type=int,
-                        default=pc_width_default, help='width of output PC, {} by default'.format(pc_by_word_default))
+                        default=None, help='width of output PC, 32 by default')
     parser.add_argument('--pc-start', metavar='addr', type=int,
-                        default=str(pc_start_default),
-                        help='starting address of output PC, {} by default'.format(hex(pc_start_default)))
+                        default=None, help='starting address of output PC, 0x0 by default')
     parser.add_argument('--pc-by-word', action='store_true',
                         help='specify this if output PC is word addressing')
     parser.add_argument('--dm-address-width', metavar='width', type=int,
-                        default=dma_width_default,
-                        help='width of DM_WRITE_ADDRESS in output, {} by default'.format(dma_width_default))
+                        default=None, help='width of DM_WRITE_ADDRESS in output, 32 by default')
     parser.add_argument('--dm-address-by-word', action='store_true',
                         help='specify this if output DM address is word addressing')
     parser.add_argument('--no-infinite-loop-appendix', action='store_true',
@@ -47,17 +46,152 @@ if __name__ == '__main__':
     parser.add_argument('--mars-timeout', metavar='secs', type=int,
                         default=None,
                         help='timeout for MARS simulation, {} by default'.format(timeout_default))
+    parser.add_argument('--mars-server', action='store_true',
+                        help='keep one MARS JVM running for all the cases instead of launching one per call')
+    parser.add_argument('--fast-jvm', action='store_true',
+                        help='launch java with start-up flags and a class data sharing archive where supported')
+    parser.add_argument('--staging', metavar='path', nargs='?',
+                        default=None, const=staging_root_default,
+                        help='stage intermediate files under this path (a tmpfs), keeping only failures in tmp, '
+                             '"{}" if no path is given'.format(staging_root_default))
+    parser.add_argument('--retention-days', metavar='days', type=float,
+                        default=None,
+                        help='remove judge directories in tmp older than this')
+    parser.add_argument('--retention-bytes', metavar='bytes', type=int,
+                        default=None,
+                        help='then remove the oldest judge directories in tmp until they take at most this')
+    parser.add_argument('--reference', action='store_true',
+                        help='produce the answers with the built-in MIPS simulator, using MARS only to assemble')
+    parser.add_argument('--cross-check', action='store_true',
+                        help='with --reference, also run MARS and fail on any disagreement')
+    parser.add_argument('--store', metavar='path', nargs='?',
+                        default=None, const=store_dir_default,
+                        help='keep failed traces compressed and deduplicated in this store, with a summary of the '
+                             'first mismatch, "{}" if no path is given'.format(store_dir_default))
+    parser.add_argument('--compact', action='store_true',
+                        help='compare compact binary traces, rendering text only for mismatches')
+    parser.add_argument('--order', choices=['glob'] + list(policies),
+                        default=None,
+                        help='order to judge the cases in, based on verdicts and timings in the history file')
+    parser.add_argument('--shard', metavar='i/n', type=parse_shard,
+                        default=None,
+                        help='only judge the i-th of n shards of the cases (from 1), balanced by the timings in '
+                             'the history file, so that CI nodes sharing it finish at about the same time')
+    parser.add_argument('--history', metavar='path',
+                        default=None,
+                        help='file to record verdicts and timings in, "{}" by default when --order is given'
+                        .format(history_fn_default))
+    parser.add_argument('--answers', metavar='path', nargs='?',
+                        default=None, const=answers_dir_default,
+                        help='keep the MARS answers in this directory by the hash of the case for later runs to '
+                             'reuse, "{}" if no path is given'.format(answers_dir_default))
+    parser.add_argument('--journal', metavar='path', nargs='?',
+                        default=None, const=journal_fn_default,
+                        help='record verdicts in this progress journal as the cases finish, "{}" if no path is '
+                             'given'.format(journal_fn_default))
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the journal, skipping the cases it records as done, unless the judge '
+                             'configuration changed')
+    parser.add_argument('--progress', choices=['text', 'json'], nargs='?',
+                        default=None, const='text',
+                        help='report throughput, ETA, the cases in flight and a tally of verdicts every few secs, '
+                             'as text or as JSON lines')
+    parser.add_argument('--progress-file', metavar='path',
+                        default=None,
+                        help='write the progress to this file instead of stderr')
+    parser.add_argument('--client', action='store_true',
+                        help='submit the job to a judge daemon started by "python -m judge.daemon" instead')
+    parser.add_argument('--socket', metavar='path',
+                        default=None,
+                        help='path to the unix socket of the judge daemon')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and rejudge when the sources or the cases change, failed cases first')
 
     args = parser.parse_args()
-    logi = Logisim(args.circuit_path, args.logisim_path, args.java_path,
-                   args.pc_width, args.pc_by_word, args.pc_start,
-                   args.dm_address_width, args.dm_address_by_word,
-                   args.im_circuit_name,
+    if args.client:
+        # the daemon keeps judges of its own, with none of these
+        local = [flag for flag, value in (('--reference', args.reference), ('--cross-check', args.cross_check),
+                                          ('--answers', args.answers), ('--staging', args.staging),
+                                          ('--retention-days', args.retention_days),
+                                          ('--retention-bytes', args.retention_bytes), ('--watch', args.watch))
+                 if value is not None and value is not False]
+        if local:
+            parser.error('{} cannot be used with --client'.format(', '.join(local)))
+    logi_kw = dict(circ_path=args.circuit_path, logisim_path=args.logisim_path, java_path=args.java_path,
+                   pc_width=args.pc_width, pc_by_word=args.pc_by_word, pc_start=args.pc_start,
+                   dma_width=args.dm_address_width, dma_by_word=args.dm_address_by_word,
+                   im_circuit_name=args.im_circuit_name,
                    appendix=None if args.no_infinite_loop_appendix else INFINITE_LOOP,
-                   timeout=args.logisim_timeout
+                   timeout=args.logisim_timeout, jvm=args.fast_jvm
                    )
-    mars = Mars(args.mars_path, java_path=args.java_path, timeout=args.mars_timeout)
-    diff = Diff(args.diff_path)
+    # left to the defaults of Logisim unless given, which are not imported before a client is ruled out
+    for k in ('pc_width', 'pc_start', 'dma_width'):
+        if logi_kw[k] is None:
+            del logi_kw[k]
+    mars_kw = dict(mars_path=args.mars_path, java_path=args.java_path, timeout=args.mars_timeout,
+                   jvm=args.fast_jvm, server=args.mars_server)
+    diff_kw = dict(diff_path=args.diff_path, compact=args.compact, store=args.store)
+    progress = args.progress and dict(mode=args.progress, file=args.progress_file)
+
+    if args.client:
+        from judge.daemon import submit
+        from judge.utils import resolve_paths, shard
+        all_kw = dict(order=args.order, history=args.history or (args.order and history_fn_default),
+                      journal=args.journal, resume=args.resume, progress=progress)
+        cases = args.asm_path
+        if args.shard:
+            with History(args.history or history_fn_default) as history:
+                cases = shard(resolve_paths(cases), *args.shard, history)
+        sys.exit(0 if submit(args.socket, 'logisim', logi_kw, mars_kw, diff_kw, cases, all_kw) else 1)
+
+    from judge import Logisim, Mars, Diff, MarsJudge, resolve_paths
+    from judge.jvm import report_launches
+    from judge.utils import shard
+    from judge.watch import watch
+
+    logi = Logisim(**logi_kw)
+    mars = Mars(**mars_kw)
+    diff = Diff(**diff_kw)
+
+    staging = None
+    retention = dict(max_age=None if args.retention_days is None else args.retention_days * 86400,
+                     max_bytes=args.retention_bytes)
+    if args.staging:
+        from judge.staging import Staging
+        staging = Staging(args.staging, **retention)
+    else:
+        from judge.staging import retain
+        retain(**retention)
+    cache = None
+    if args.answers:
+        from judge.cache import AnswerCache
+        cache = AnswerCache(args.answers)
+        cache.prune(**retention)
 
-    judge = MarsJudge(logi, mars, diff)
-    judge.all(resolve_paths(args.asm_path))
+    judge = MarsJudge(logi, mars, diff, cache=cache, staging=staging)
+    if args.reference:
+        from judge.sim import Simulator
+        judge.set_reference(Simulator(), args.cross_check)
+    if args.watch:
+        watch_args = (judge, args.asm_path, args.circuit_path)
+        watch_kw = dict(order=args.order, journal=args.journal, resume=args.resume, progress=progress)
+        if args.order or args.history:
+            with History(args.history or history_fn_default) as history:
+                watch(*watch_args, history=history, **watch_kw)
+        else:
+            watch(*watch_args, **watch_kw)
+    elif args.order or args.history or args.shard:
+        with History(args.history or history_fn_default) as history:
+            paths = resolve_paths(args.asm_path)
+            if args.shard:
+                paths = shard(paths, *args.shard, history)
+            judge.all(paths, order=args.order, history=history, journal=args.journal, resume=args.resume,
+                      progress=progress)
+    else:
+        judge.all(resolve_paths(args.asm_path), journal=args.journal, resume=args.resume, progress=progress)
+    report_launches(logi)
+    report_launches(mars)
+    if mars.server:
+        mars.server.report()
+    if diff.store:
+        diff.store.report()
@@ -0,0 +1,32 @@
+from judge.base import BaseHexRunner
+from judge.mars import Mars
+
+
+# answers 1 in $8, or 2 for programs mentioning "bad"
+class FakeMars(Mars):
+    def __call__(self, asm_path, out_path=None, hex_path=None, a=False, **kw):
+        if hex_path:
+            with open(hex_path, 'w', encoding='utf-8') as fp:
+                fp.write('00000000\n')
+        if out_path is not None:
+            with open(asm_path, encoding='utf-8') as fp:
+                value = 2 if 'bad' in fp.read() else 1
+            with open(out_path, 'w', encoding='utf-8') as fp:
+                fp.write('@00003000: $ 8 <= {:08x}\n'.format(value))
+
+
+# a design always writing value to $8
+class FakeRunner(BaseHexRunner):
+    def __init__(self, value=1, **kw):
+        super().__init__(**kw)
+        self.value = value
+
+    def set_hex_path(self, path):
+        self._set_hex_path(path)
+
+    def set_handler_hex_path(self, path):
+        self._set_handler_hex_path(path)
+
+    def run(self, out_path):
+        with open(out_path, 'w', encoding='utf-8') as fp:
+            fp.write('@00003000: $ 8 <= {:08x}\n'.format(self.value))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# A scripted stand-in for an ISim test bench, speaking the tcl subset the judge uses: restart, run,
+# puts with [expr {...}] and exit, from stdin like the interactive shell, or from the file of -tclbatch.
+# Like ISim, it echoes every command after its prompt. A run prints a register write per word of
+# code.txt, and a word of deadbeef crashes the interactive shell, so that the judge falls back to a batch run.
+import re, sys
+
+
+def write(s):
+    sys.stdout.write(s + '\n')
+    sys.stdout.flush()
+
+
+def simulate(interactive):
+    with open('code.txt', encoding='utf-8') as fp:
+        words = fp.read().split()
+    for i, word in enumerate(words):
+        if word == 'deadbeef' and interactive:
+            sys.exit(3)
+        write('@{:08x}: ${:2d} <= {}'.format(0x3000 + 4 * i, i % 32, word))
+
+
+def main():
+    interactive = sys.argv[1:2] != ['-tclbatch']
+    lines = sys.stdin if interactive else open(sys.argv[2], encoding='utf-8')
+    for line in lines:
+        cmd = line.strip()
+        write('ISim> ' + cmd)
+        if cmd == 'exit':
+            break
+        elif cmd.startswith('run'):
+            simulate(interactive)
+        elif cmd.startswith('puts'):
+            text = re.match(r'puts "(.*)"$', cmd).group(1)
+            write(re.sub(r'\[expr \{(\d+)\}\]', lambda m: m.group(1), text))
+        elif cmd != 'restart':
+            write('invalid command name "{}"'.format(cmd.split()[0]))
+
+
+if __name__ == '__main__':
+    main()
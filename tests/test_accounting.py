@@ -0,0 +1,68 @@
+import io, os, sys
+
+import pytest
+
+from judge.accounting import Usage, outliers, report
+from judge.base import BaseRunner
+
+
+class PrintRunner(BaseRunner):
+    @staticmethod
+    def parse(line):
+        return line
+
+    def __call__(self, code, out_path):
+        self._communicate([sys.executable, '-c', code], out_path)
+
+
+# holds 64 MiB and spins for a while before printing
+HOG = '''
+import os
+block = bytearray(64 << 20)
+for i in range(0, len(block), 4096):
+    block[i] = 1
+end = os.times().user + 0.3
+while os.times().user < end:
+    pass
+print('\\n'.join(['@00003000: $ 1 <= 00000001'] * 100))
+'''
+
+
+@pytest.mark.skipif(not hasattr(os, 'wait4'), reason='resource usage needs os.wait4')
+def test_child_usage_is_accounted(tmp_path):
+    runner = PrintRunner(timeout=30)
+    runner(HOG, str(tmp_path / 'out'))
+    usage = runner.accounting.total()
+    assert usage.n == 1
+    assert usage.user >= 0.2
+    assert usage.maxrss >= 64 << 10
+    assert usage.output == len('@00003000: $ 1 <= 00000001\n') * 100
+    assert usage.wall >= usage.user / 2
+    mark = runner.accounting.mark()
+    runner('pass', str(tmp_path / 'out'))
+    assert runner.accounting.since(mark).n == 1
+    assert runner.accounting.total().n == 2
+
+
+def test_outliers_are_far_above_the_median_of_their_runner():
+    cases = {'case{}.asm'.format(i): {'Logisim': Usage(user=1., maxrss=100 << 10, n=1),
+                                      'ISim': Usage(user=0.1, maxrss=10 << 10, n=1)}
+             for i in range(5)}
+    cases['case1.asm']['Logisim'] = Usage(user=2.5, system=1., maxrss=100 << 10, n=1)  # 3.5x the CPU
+    cases['case2.asm']['Logisim'] = Usage(user=1., maxrss=400 << 10, n=1)  # 4x the memory
+    cases['case3.asm']['ISim'] = Usage(user=0.4, maxrss=10 << 10, n=1)  # 4x, but under a second
+    cases['case4.asm']['ISim'] = Usage(user=0.1, maxrss=50 << 10, n=1)  # 5x, but a few MiB
+    cases['case5.asm'] = {'ISim': Usage(user=0.1, maxrss=10 << 10, n=1)}  # another runner only
+    assert outliers(cases) == [
+        ('case1.asm', 'Logisim', 'CPU 3.50s, 3.5x the median'),
+        ('case2.asm', 'Logisim', 'peak RSS 400.0 MiB, 4.0x the median'),
+    ]
+    assert [(path, name) for path, name, _ in outliers(cases, factor=2.)] == [
+        ('case1.asm', 'Logisim'), ('case2.asm', 'Logisim')]
+    fp = io.StringIO()
+    report({'Logisim': Usage(n=1), 'ISim': Usage()}, cases, fp)
+    assert fp.getvalue().splitlines() == [
+        'Logisim: 1 runs, wall 0.00s, user 0.00s, sys 0.00s, peak RSS 0.0 MiB, output 0.0 KiB',
+        'Outlier: Logisim on case1.asm: CPU 3.50s, 3.5x the median',
+        'Outlier: Logisim on case2.asm: peak RSS 400.0 MiB, 4.0x the median',
+    ]
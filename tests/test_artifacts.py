@@ -0,0 +1,30 @@
+import os, subprocess, sys
+
+from judge import artifacts
+from judge.artifacts import ArtifactStore
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_put_skips_compressing_stored_content(tmp_path, monkeypatch):
+    opened = []
+    ext, open_gzip = artifacts.codecs['gzip']
+    monkeypatch.setitem(artifacts.codecs, 'gzip', (ext, lambda *a, **kw: opened.append(a) or open_gzip(*a, **kw)))
+    src = tmp_path / 'out.txt'
+    src.write_text('@00003000: $ 1 <= 00000001\n' * 100)
+    store = ArtifactStore(str(tmp_path / 'store'))
+    digest = store.put(str(src))
+    assert store.put(str(src)) == digest
+    assert len(opened) == 1
+    assert (store.stored, store.deduplicated) == (1, 1)
+    assert list(store.lines(digest[:8])) == ['@00003000: $ 1 <= 00000001'] * 100
+    assert not [fn for fn in os.listdir(store.root()) if fn.endswith('.tmp')]
+
+
+def test_judging_without_a_store_leaves_the_compressors_alone():
+    # the CLIs take their defaults from judge.defaults, so this covers them too
+    code = ('import sys, judge.defaults, judge.diff, judge.judge, judge.logisim, judge.isim; '
+            'print(" ".join(m for m in ("judge.artifacts", "gzip") if m in sys.modules))')
+    r = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True, cwd=root)
+    assert r.returncode == 0
+    assert r.stdout.split() == []
@@ -0,0 +1,33 @@
+import os, subprocess, sys
+
+import pytest
+
+from judge.daemon import Daemon
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_judges_are_kept_per_working_directory(tmp_path):
+    daemon = Daemon(str(tmp_path / 'sock'))
+    runner_kw = {'circ_path': 'mips.circ', 'logisim_path': 'logisim.jar'}
+    a = daemon.get_judge('logisim', runner_kw, {}, {}, '/home/alice/co')
+    b = daemon.get_judge('logisim', runner_kw, {}, {}, '/home/bob/co')
+    assert a is not b
+    assert daemon.get_judge('logisim', runner_kw, {}, {}, '/home/alice/co') is a
+
+
+@pytest.mark.parametrize('script', ['isim-judge.py', 'logisim-judge.py'])
+def test_client_starts_without_the_judges(script):
+    r = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(root, script), '--help'],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, cwd=root)
+    assert r.returncode == 0
+    imported = {line.split('|')[-1].strip() for line in r.stderr.splitlines()}
+    assert not imported & {'judge.base', 'judge.isim', 'judge.artifacts', 'judge.cache', 'judge.trace', 'numpy'}
+
+
+def test_client_rejects_local_options():
+    r = subprocess.run([sys.executable, os.path.join(root, 'isim-judge.py'), 'proj', 'tb', 'cases',
+                        '--client', '--reference', '--retention-days', '0'],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, cwd=root)
+    assert r.returncode == 2
+    assert '--reference, --retention-days cannot be used with --client' in r.stderr
@@ -0,0 +1,86 @@
+import os, socket, threading
+
+import pytest
+
+from judge.diff import Diff
+from judge.distributed import Connection, Coordinator, Worker, OK, FAILED
+from judge.judge import MarsJudge
+from judge.staging import Staging
+
+from fakes import FakeMars, FakeRunner
+
+
+@pytest.mark.parametrize('staged', [False, True])
+def test_round_trip(tmp_path, monkeypatch, staged):
+    monkeypatch.chdir(tmp_path)
+    paths = []
+    for name, text in (('a.asm', 'nop\n'), ('b.asm', 'nop # bad\n'), ('c.asm', 'nop\nnop\n')):
+        with open(name, 'w', encoding='utf-8') as fp:
+            fp.write(text)
+        paths.append(name)
+
+    coordinator = Coordinator(paths, port=0, artifact_dir='dist')
+    port = coordinator.bind()
+    results = []
+    t = threading.Thread(target=lambda: results.extend(coordinator.serve()))
+    t.start()
+
+    staging = Staging(str(tmp_path / 'shm')) if staged else None
+    judge = MarsJudge(FakeRunner(), FakeMars(), Diff(), staging=staging)
+    assert Worker(judge, port=port, name='w').run() == 3
+    t.join(10)
+    assert not t.is_alive()
+
+    assert [r['verdict'] for r in results] == [OK, FAILED, OK]
+    assert all(r['worker'] == 'w' for r in results)
+    artifacts = results[1]['artifacts']
+    assert sorted(os.path.splitext(p)[1] for p in artifacts) == ['.ans', '.diff', '.out']
+    with open([p for p in artifacts if p.endswith('.ans')][0], encoding='utf-8') as fp:
+        assert fp.read() == '@00003000: $ 8 <= 00000002\n'
+
+
+# takes a case like a worker, then drops the connection, or keeps it without ever answering
+def take_and_abandon(port, hang):
+    sock = socket.create_connection(('127.0.0.1', port))
+    conn = Connection(sock)
+    conn.send(op='hello', name='lost')
+    conn.recv()
+    conn.send(op='next')
+    case = conn.recv()
+    if not hang:
+        conn.close()
+    return case['id'], conn
+
+
+@pytest.mark.parametrize('hang', [False, True])
+def test_lost_case_is_requeued(tmp_path, monkeypatch, hang):
+    monkeypatch.chdir(tmp_path)
+    paths = []
+    for name in ('a.asm', 'b.asm', 'c.asm'):
+        with open(name, 'w', encoding='utf-8') as fp:
+            fp.write('nop\n')
+        paths.append(name)
+
+    coordinator = Coordinator(paths, port=0, artifact_dir='dist', lease=1 if hang else None)
+    port = coordinator.bind()
+    results = []
+    t = threading.Thread(target=lambda: results.extend(coordinator.serve()))
+    t.start()
+
+    lost, conn = take_and_abandon(port, hang)
+    workers = [Worker(MarsJudge(FakeRunner(), FakeMars(), Diff()), port=port, name='w{}'.format(k))
+               for k in range(2)]
+    counts = []
+    threads = [threading.Thread(target=lambda w=w: counts.append(w.run())) for w in workers]
+    for w in threads:
+        w.start()
+    for w in threads:
+        w.join(10)
+    t.join(10)
+    conn.close()
+    assert not t.is_alive()
+
+    assert sum(counts) == 3
+    assert [r['verdict'] for r in results] == [OK, OK, OK]
+    assert results[lost]['worker'] in ('w0', 'w1')
+    assert coordinator.attempts[lost] == 2
@@ -0,0 +1,63 @@
+import io, os
+
+import pytest
+
+from judge.base import BaseHexRunner
+from judge.diff import Diff
+from judge.judge import FanOutJudge, DesignsFailed
+from judge.schedule import History
+
+from fakes import FakeMars, FakeRunner
+
+
+def test_designs_get_their_own_tmp_dirs():
+    runners = [BaseHexRunner(), BaseHexRunner()]
+    judge = FanOutJudge(runners, None, names=['a', 'b'])
+    dirs = [runner.tmp_dir.path for runner in runners]
+    assert dirs[0] != dirs[1]
+    assert all(os.path.dirname(d) == judge.tmp_dir.path for d in dirs)
+
+
+def make_cases(names):
+    for name in names:
+        with open(name, 'w', encoding='utf-8') as fp:
+            fp.write('nop\n')
+    return list(names)
+
+
+@pytest.mark.parametrize('drop_failed', [True, False])
+def test_verdict_matrix(tmp_path, monkeypatch, drop_failed):
+    monkeypatch.chdir(str(tmp_path))
+    paths = make_cases(['a.asm', 'b.asm'])
+    judge = FanOutJudge([FakeRunner(1), FakeRunner(2)], FakeMars(), Diff(), names=['good', 'bad'],
+                        drop_failed=drop_failed)
+    passed, failed = [], []
+    judge.all(paths, on_success=passed.append, on_error=failed.append, usage=False)
+    assert judge.matrix['a.asm']['good'] == 'ok'
+    assert judge.matrix['a.asm']['bad'].startswith('InconsistentResults')
+    if drop_failed:
+        assert judge.active == [0]
+        assert judge.matrix['b.asm'] == {'good': 'ok'}
+        assert (passed, failed) == (['b.asm'], ['a.asm'])
+    else:
+        assert judge.active == [0, 1]
+        assert judge.matrix['b.asm']['bad'].startswith('InconsistentResults')
+        assert (passed, failed) == ([], ['a.asm', 'b.asm'])
+    out = io.StringIO()
+    judge.report(out)
+    assert out.getvalue() == 'good: 2/2 passed\nbad: 0/{} passed{}\n'.format(
+        1 if drop_failed else 2, ', dropped' if drop_failed else '')
+
+
+def test_run_stops_when_no_design_is_left(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    paths = make_cases(['a.asm', 'b.asm', 'c.asm'])
+    judge = FanOutJudge([FakeRunner(2)], FakeMars(), Diff(), names=['bad'])
+    passed, failed = [], []
+    with History('history.json') as history:
+        judge.all(paths, on_success=passed.append, on_error=failed.append, history=history, usage=False)
+        assert history.get('b.asm') is None and history.get('c.asm') is None
+    assert (passed, failed) == ([], ['a.asm'])
+    assert list(judge.matrix) == ['a.asm']
+    with pytest.raises(DesignsFailed):
+        judge('b.asm')
@@ -0,0 +1,29 @@
+import json, os
+
+from judge.base import VerificationFailed
+from judge.fuzz import Campaign, Generator
+
+
+class FlakyJudge:
+    # fails every other program, alternating between a verification failure and a crash
+    def __init__(self):
+        self.n = 0
+
+    def __call__(self, asm_path):
+        self.n += 1
+        if self.n % 4 == 2:
+            raise VerificationFailed('mismatch')
+        if self.n % 4 == 0:
+            raise RuntimeError('Icarus subprocess returned 1')
+
+
+def test_campaign_saves_crashing_seeds(tmp_path):
+    campaign = Campaign(FlakyJudge, Generator(length=20), budget=60., seed=100, fuzz_dir=str(tmp_path),
+                        max_programs=4)
+    result = campaign.run()
+    assert result.programs == 4
+    assert sorted(result.failures) == [101, 103]
+    with open(os.path.join(str(tmp_path), 'seeds.jsonl'), encoding='utf-8') as fp:
+        errors = sorted((e['seed'], e['error']) for e in map(json.loads, fp))
+    assert errors == [(101, 'VerificationFailed: mismatch'), (103, 'RuntimeError: Icarus subprocess returned 1')]
+    assert os.path.isfile(os.path.join(str(tmp_path), 'failures', '103.asm'))
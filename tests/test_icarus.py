@@ -0,0 +1,55 @@
+import os, sys
+
+import pytest
+
+from judge.concurrent import PropagatingThread
+from judge.icarus import Icarus
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='the stand-in compiler is a script')
+def test_compile_key_covers_include_dirs(tmp_path):
+    # a stand-in iverilog writing its arguments to the -o file
+    iverilog = tmp_path / 'iverilog'
+    iverilog.write_text('#!{}\nimport sys\nopen(sys.argv[2], "w").write(" ".join(sys.argv))\n'.format(
+        sys.executable))
+    iverilog.chmod(0o755)
+    (tmp_path / 'inc' / 'sub').mkdir(parents=True)
+    header = tmp_path / 'inc' / 'sub' / 'defs.vh'
+    header.write_text('`define WIDTH 32\n')
+    source = tmp_path / 'cpu.v'
+    source.write_text('`include "sub/defs.vh"\nmodule tb; endmodule\n')
+    icarus = Icarus(str(source), iverilog_path=str(iverilog), cache_dir=str(tmp_path / 'vvp'),
+                    include_dirs=[str(tmp_path / 'inc')])
+    icarus.compile()
+    first = icarus.vvp_file
+    icarus.compile()
+    assert icarus.vvp_file == first
+    header.write_text('`define WIDTH 64\n')
+    icarus.compile()
+    assert icarus.vvp_file != first
+    assert os.path.exists(icarus.vvp_file)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='the stand-in compiler is a script')
+def test_concurrent_compiles(tmp_path):
+    # a slow stand-in iverilog writing to the -o file in pieces, as the real one does
+    iverilog = tmp_path / 'iverilog'
+    iverilog.write_text('#!{}\nimport sys, time\nfp = open(sys.argv[2], "a")\nfp.write("head\\n"); fp.flush()\n'
+                        'time.sleep(0.3)\nfp.write("tail\\n")\n'.format(sys.executable))
+    iverilog.chmod(0o755)
+    source = tmp_path / 'cpu.v'
+    source.write_text('module tb; endmodule\n')
+    runners = [Icarus(str(source), iverilog_path=str(iverilog), cache_dir=str(tmp_path / 'vvp')) for _ in range(4)]
+    threads = [PropagatingThread(target=runner.compile) for runner in runners]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(runner.vvp_file for runner in runners)) == 1
+    with open(runners[0].vvp_file, encoding='utf-8') as fp:
+        assert fp.read() == 'head\ntail\n'
+    assert os.listdir(str(tmp_path / 'vvp')) == [os.path.basename(runners[0].vvp_file)]
+
+
+def test_fingerprint_covers_include_dirs():
+    assert Icarus('cpu.v', include_dirs=['a']).fingerprint() != Icarus('cpu.v', include_dirs=['b']).fingerprint()
@@ -0,0 +1,38 @@
+import os
+
+from judge.base import BaseHexRunner, INFINITE_LOOP
+from judge.image import HexImage, write_atomic
+
+
+def test_write_atomic_skips_identical_content(tmp_path):
+    path = str(tmp_path / 'code.txt')
+    assert write_atomic(path, '00000000\n')
+    os.utime(path, (1000, 1000))
+    assert not write_atomic(path, b'00000000\n')
+    assert os.stat(path).st_mtime == 1000
+    assert write_atomic(path, '00000001\n')
+    assert os.stat(path).st_mtime != 1000
+    assert os.listdir(str(tmp_path)) == ['code.txt']
+
+
+def test_put_writes_hex_appendix_and_handler_once(tmp_path, monkeypatch):
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr(os, 'replace', lambda src, dst: replaced.append(dst) or replace(src, dst))
+    hex_path, handler_path = str(tmp_path / 'code.txt'), str(tmp_path / 'code_handler.txt')
+    runner = BaseHexRunner(appendix=INFINITE_LOOP, _hex_path=hex_path, _handler_hex_path=handler_path)
+    image = HexImage('24080001\n', handler='42000018\n')
+
+    assert image.put(runner)
+    assert replaced == [hex_path, handler_path]
+    with open(hex_path, encoding='utf-8') as fp:
+        assert fp.read() == '24080001\n\n' + INFINITE_LOOP
+    with open(handler_path, encoding='utf-8') as fp:
+        assert fp.read() == '42000018\n'
+
+    # the same image again touches neither file, so simulators watching them see no change
+    assert not image.put(runner)
+    assert not HexImage('24080001\n', handler='42000018\n').put(runner)
+    assert replaced == [hex_path, handler_path]
+    assert HexImage('24080002\n', handler='42000018\n').put(runner)
+    assert replaced == [hex_path, handler_path, hex_path]
@@ -0,0 +1,46 @@
+import os, shutil, sys
+
+import pytest
+
+from judge.isim import ISim
+
+standin_path = os.path.join(os.path.dirname(__file__), 'isim_standin.py')
+
+
+@pytest.fixture
+def isim(tmp_path):
+    tb_path = str(tmp_path / 'tb')
+    shutil.copy(standin_path, tb_path)
+    os.chmod(tb_path, 0o755)
+    r = ISim(tb_path, ise_path=str(tmp_path), timeout=10,
+             session={'command': [sys.executable, standin_path]})
+    yield r
+    r.session.close()
+
+
+def judge_words(isim, tmp_path, words):
+    with open(isim.get_hex_path(), 'w', encoding='utf-8') as fp:
+        fp.write('\n'.join(words) + '\n')
+    out_path = str(tmp_path / 'out.txt')
+    isim(out_path)
+    with open(out_path, encoding='utf-8') as fp:
+        return fp.read().splitlines()
+
+
+def test_session_reruns_and_parses_output(isim, tmp_path):
+    # writes to $0 are dropped
+    assert judge_words(isim, tmp_path, ['00000001', '00000002']) == ['@00003004: $ 1 <= 00000002']
+    # the echoed commands, including the one printing the sentinel, are not taken for output or for the end
+    assert judge_words(isim, tmp_path, ['0000000a', '0000000b', '0000000c']) == [
+        '@00003004: $ 1 <= 0000000b', '@00003008: $ 2 <= 0000000c']
+    assert isim.session.spawns == 1
+    assert isim.session.requests == 2
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='the stand-in test bench is a script')
+def test_crashed_session_falls_back_to_a_batch_run(isim, tmp_path):
+    assert judge_words(isim, tmp_path, ['00000001', '00000002', 'deadbeef']) == [
+        '@00003004: $ 1 <= 00000002', '@00003008: $ 2 <= deadbeef']
+    assert isim.session.session is None
+    assert judge_words(isim, tmp_path, ['00000001', '00000003']) == ['@00003004: $ 1 <= 00000003']
+    assert isim.session.spawns == 2
@@ -0,0 +1,37 @@
+import json, os
+
+from judge.cache import AnswerCache
+from judge.journal import Journal
+from judge.schedule import PASSED, FAILED
+
+
+def test_resume_drops_torn_lines(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    journal = Journal('journal.jsonl').open('abc')
+    journal.record('a.asm', PASSED)
+    journal.record('b.asm', FAILED)
+    with open('journal.jsonl', 'a', encoding='utf-8') as fp:
+        fp.write('{"case": "c.a')  # interrupted mid-line
+
+    journal = Journal('journal.jsonl').open('abc', resume=True)
+    assert journal.completed('a.asm') and not journal.completed('b.asm')
+    journal.record('c.asm', PASSED)
+    with open('journal.jsonl', encoding='utf-8') as fp:
+        lines = [json.loads(line) for line in fp]
+    assert [e.get('case') for e in lines] == [None, 'a.asm', 'b.asm', 'c.asm']
+    assert Journal('journal.jsonl').open('abc', resume=True).completed('c.asm')
+
+
+def test_prune_answers(tmp_path):
+    cache = AnswerCache(str(tmp_path))
+    for i, key in enumerate(['old', 'mid', 'new']):
+        with open(os.path.join(str(tmp_path), key + '.ans'), 'w', encoding='utf-8') as fp:
+            fp.write('x' * 100)
+        cache.put(key, 'y' * 100)
+        for ext in ('.hex', '.ans'):
+            os.utime(os.path.join(str(tmp_path), key + ext), (1000 + i, 1000 + i))
+    assert cache.prune(max_bytes=450) == 1
+    assert sorted(os.listdir(str(tmp_path))) == ['mid.ans', 'mid.hex', 'new.ans', 'new.hex']
+    assert cache.get('old') is None
+    assert cache.prune(max_age=60) == 2
+    assert os.listdir(str(tmp_path)) == []
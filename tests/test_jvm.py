@@ -0,0 +1,45 @@
+import io, os, sys, time
+
+import pytest
+
+from judge.base import BaseRunner
+from judge.jvm import LaunchStats, report_launches
+
+
+class SlowRunner(BaseRunner):
+    jvm = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.launches = LaunchStats()
+
+    @staticmethod
+    def parse(line):
+        return line
+
+    def __call__(self, code, out_path):
+        self._communicate([sys.executable, '-c', code], out_path)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='pipes cannot be selected on Windows')
+def test_launch_is_timed_to_the_first_output(tmp_path):
+    runner = SlowRunner(timeout=10)
+    runner('import sys, time; print(1); sys.stdout.flush(); time.sleep(1); print(2)', str(tmp_path / 'out'))
+    assert runner.launches.n == 1
+    assert runner.launches.max < 1
+    with open(str(tmp_path / 'out'), encoding='utf-8') as fp:
+        assert fp.read().split() == ['1', '2']
+    fp = io.StringIO()
+    report_launches(runner, fp)
+    assert 'SlowRunner JVM launch latency with default flags: 1 launches' in fp.getvalue()
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='pipes cannot be selected on Windows')
+def test_silent_launch_times_out_once(tmp_path, capsys):
+    runner = SlowRunner(timeout=1)
+    start = time.perf_counter()
+    runner('import time; time.sleep(5)', str(tmp_path / 'out'))
+    assert time.perf_counter() - start < 1.8
+    assert runner.timeouts == 1
+    assert runner.launches.n == 0
+    assert 'Permitted: SlowRunner timed out after 1 secs' in capsys.readouterr().out
@@ -0,0 +1,89 @@
+import os, sys, threading, time
+
+import pytest
+
+from judge.base import BaseRunner
+
+
+class PrintRunner(BaseRunner):
+    @staticmethod
+    def parse(line):
+        return line
+
+    def __call__(self, code, out_path):
+        self._communicate([sys.executable, '-c', code], out_path)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='resource limits are only supported on POSIX')
+def test_limits_apply_before_the_child_runs(tmp_path):
+    out_path = str(tmp_path / 'out')
+    # the first thing the child does already runs under the limit
+    PrintRunner(limits={'nofile': 64})(
+        'import resource; print(*resource.getrlimit(resource.RLIMIT_NOFILE))', out_path)
+    with open(out_path, encoding='utf-8') as fp:
+        assert fp.read().split() == ['64', '64']
+
+
+# the child leaves a grandchild behind, which records its pid and holds the output pipe open
+SPAWN = '''
+import subprocess, sys, time
+p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(15)'])
+with open({!r}, 'w') as fp:
+    fp.write(str(p.pid))
+time.sleep(15)
+'''
+
+
+def alive(pid):
+    try:
+        with open('/proc/{}/stat'.format(pid)) as fp:
+            return fp.read().split(')')[-1].split()[0] != 'Z'  # zombies wait for a reaper only
+    except FileNotFoundError:
+        return False
+
+
+def wait_for(fn, secs=10):
+    deadline = time.time() + secs
+    while not os.path.exists(fn):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    time.sleep(0.1)
+    with open(fn) as fp:
+        return int(fp.read())
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='process states are read from /proc')
+def test_timeout_kills_grandchildren(tmp_path):
+    pid_fn = str(tmp_path / 'pid')
+    start = time.time()
+    PrintRunner(timeout=1)(SPAWN.format(pid_fn), str(tmp_path / 'out'))
+    assert time.time() - start < 10
+    pid = wait_for(pid_fn)
+    time.sleep(0.2)
+    assert not alive(pid)
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='process states are read from /proc')
+def test_stop_kills_grandchildren(tmp_path):
+    pid_fn = str(tmp_path / 'pid')
+    runner = PrintRunner(timeout=30)
+    errors = []
+
+    def run():
+        try:
+            runner(SPAWN.format(pid_fn), str(tmp_path / 'out'))
+        except RuntimeError as e:
+            errors.append(e)
+
+    t = threading.Thread(target=run)
+    t.start()
+    pid = wait_for(pid_fn)
+    assert alive(pid)
+    start = time.time()
+    runner.stop()
+    t.join(20)
+    assert not t.is_alive()
+    assert time.time() - start < 10  # not waiting for the grandchild to close the output pipe
+    assert errors  # killed, so the child returned nonzero
+    time.sleep(0.2)
+    assert not alive(pid)
@@ -0,0 +1,28 @@
+import sys
+
+from judge.mars_server import MarsServer
+
+# a stand-in driver printing its request back without a line break, as MARS may, right before the sentinel
+STANDIN = r'''
+import sys
+print('\x01mars-server ready', flush=True)
+for line in sys.stdin:
+    sys.stdout.write(line.strip().replace('\t', ' ') + '\x01mars-server done 3\n')
+    sys.stdout.flush()
+'''
+
+
+class StandinServer(MarsServer):
+    def command(self):
+        return [sys.executable, '-c', STANDIN]
+
+
+def test_sentinel_after_output_without_line_break():
+    server = StandinServer('java', 'Mars.jar')
+    server.class_dir = ''
+    try:
+        assert server.request(['a', 'b'], timeout=10) == (b'a b', 3)
+        assert server.request(['c'], timeout=10) == (b'c', 3)
+    finally:
+        server.close()
+    assert server.spawns == 1
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from judge.diff import Diff
+from judge.journal import PERMITTED
+from judge.judge import MarsJudge
+from judge.progress import Progress, TIMED_OUT, format_secs
+from judge.schedule import PASSED, FAILED
+
+from fakes import FakeMars, FakeRunner
+
+
+def read_events(path):
+    with open(path, encoding='utf-8') as fp:
+        return [json.loads(line) for line in fp]
+
+
+def test_json_records_cases_and_stages(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    progress = Progress('json', file='progress.jsonl', interval=60)
+    progress.start(['a.asm', 'b.asm', 'c.asm'])
+    progress.begin('a.asm')
+    progress.stage('mars')
+    progress.stage('diff', worker='w1', path='b.asm')
+    inflight = {e['worker']: (e['case'], e['stage']) for e in progress.snapshot()['inflight']}
+    assert inflight == {'MainThread': ('a.asm', 'mars'), 'w1': ('b.asm', 'diff')}
+    progress.end('a.asm', PASSED)
+    progress.stage(None, worker='w1')
+    assert progress.snapshot()['inflight'] == []
+    progress.begin('b.asm')
+    progress.end('b.asm', FAILED)
+    progress.stop()
+    events = read_events('progress.jsonl')
+    assert [(e['event'], e.get('case'), e.get('verdict')) for e in events] == [
+        ('case', 'a.asm', PASSED), ('case', 'b.asm', FAILED), ('end', None, None)]
+    end = events[-1]
+    assert (end['done'], end['total'], end['inflight']) == (2, 3, [])
+    assert end['tally'] == {PASSED: 1, TIMED_OUT: 0, FAILED: 1, PERMITTED: 0}
+
+
+# times out on the cases listed, permitted, having written the right answer
+class TimingOutRunner(FakeRunner):
+    def __init__(self, slow, **kw):
+        super().__init__(**kw)
+        self.slow = slow
+        self.runs = 0
+
+    def run(self, out_path):
+        super().run(out_path)
+        self.runs += 1
+        if self.runs in self.slow:
+            self._timed_out(None)
+
+
+def test_all_tallies_permitted_timeouts(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(str(tmp_path))
+    paths = ['a.asm', 'b.asm', 'c_bad.asm', 'd.asm']
+    for path in paths:
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write('bad\n' if 'bad' in path else 'nop\n')
+    judge = MarsJudge(TimingOutRunner({2, 4}), FakeMars(), Diff())
+    judge.all(paths, stop_on_error=False, usage=False,
+              progress={'mode': 'json', 'file': 'progress.jsonl', 'interval': 60})
+    assert capsys.readouterr().out.count('Permitted: TimingOutRunner timed out') == 2
+    events = read_events('progress.jsonl')
+    assert [(e['case'], e['verdict']) for e in events[:-1]] == [
+        ('a.asm', PASSED), ('b.asm', TIMED_OUT), ('c_bad.asm', FAILED), ('d.asm', TIMED_OUT)]
+    assert all(e['elapsed'] >= 0 for e in events[:-1])
+    end = events[-1]
+    assert end['event'] == 'end'
+    assert (end['done'], end['total']) == (4, 4)
+    assert end['tally'] == {PASSED: 1, TIMED_OUT: 2, FAILED: 1, PERMITTED: 0}
+    assert judge.progress is None
+
+
+@pytest.mark.parametrize('secs, text', [(None, '?'), (2.34, '2.3s'), (42.6, '43s'), (125, '2m05s'), (7300, '2h01m')])
+def test_format_secs(secs, text):
+    assert format_secs(secs) == text
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        Progress('xml')
@@ -0,0 +1,43 @@
+import os
+
+from judge.schedule import History, PASSED, FAILED, schedule
+from judge.utils import shard
+
+
+def test_history_survives_moving_the_checkout(tmp_path, monkeypatch):
+    for root in ('a', 'b'):
+        os.makedirs(str(tmp_path / root / 'cases'))
+    monkeypatch.chdir(str(tmp_path / 'a'))
+    with History('history.json') as history:
+        history.record(os.path.abspath('cases/x.asm'), FAILED, 2.)
+        history.record('cases/y.asm', PASSED, 1.)
+    os.rename('history.json', str(tmp_path / 'b' / 'history.json'))
+
+    monkeypatch.chdir(str(tmp_path / 'b'))
+    with History('history.json') as history:
+        assert history.get(os.path.abspath('cases/x.asm'))['last'] == FAILED
+        assert history.time('./cases/y.asm') == 1.
+        assert schedule(['cases/y.asm', 'cases/x.asm'], history, 'failed-first') == ['cases/x.asm', 'cases/y.asm']
+
+
+def test_shards_agree_across_case_roots(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    names = ['{}.asm'.format(i) for i in range(12)]
+    for root in ('a', 'b'):
+        os.makedirs(os.path.join(root, 'cases'))
+        for i, name in enumerate(names):
+            with open(os.path.join(root, 'cases', name), 'w', encoding='utf-8') as fp:
+                fp.write('addiu $t0, $t0, {}\\n'.format(i) * (i % 5 + 1))
+    with History('history.json') as history:
+        # timings disagreeing with the sizes, recorded on the node keeping the cases under a
+        for i, name in enumerate(names):
+            history.record(os.path.join('a', 'cases', name), PASSED, 10. if i % 3 == 0 else .1)
+
+    with History('history.json') as history:
+        splits = {root: [[os.path.basename(p) for p in shard([os.path.join(root, 'cases', name) for name in names],
+                                                             k, 3, history)] for k in range(3)]
+                  for root in ('a', os.path.join(str(tmp_path), 'b'))}
+    split = splits['a']
+    assert split == splits[os.path.join(str(tmp_path), 'b')]
+    # the slow cases are spread over the shards
+    assert [sum(int(name[:-4]) % 3 == 0 for name in names) for names in split] == [2, 1, 1]
@@ -0,0 +1,158 @@
+import pytest
+
+from judge.cache import AnswerCache
+from judge.sim import Simulator, SimulationError, EXC_OV
+from judge.trace import KIND_REG, KIND_MEM
+
+from fakes import FakeMars
+
+ERET = 0x42000018
+NOP = 0
+
+
+def r_type(fn, rd=0, rs=0, rt=0, sh=0):
+    return rs << 21 | rt << 16 | rd << 11 | sh << 6 | fn
+
+
+def i_type(op, rt, rs, imm):
+    return op << 26 | rs << 21 | rt << 16 | imm & 0xffff
+
+
+def ori(rt, rs, imm):
+    return i_type(13, rt, rs, imm)
+
+
+def lui(rt, imm):
+    return i_type(15, rt, 0, imm)
+
+
+def beq(rs, rt, offset):
+    return i_type(4, rt, rs, offset)
+
+
+def jal(target):
+    return 3 << 26 | (target >> 2) & 0x3ffffff
+
+
+def mfc0(rt, rd):
+    return 16 << 26 | rt << 16 | rd << 11
+
+
+def mtc0(rt, rd):
+    return 16 << 26 | 4 << 21 | rt << 16 | rd << 11
+
+
+def text(words):
+    return '\n'.join('{:08x}'.format(w) for w in words)
+
+
+def run(words, db=False, data=None, handler=None):
+    sim = Simulator()
+    assert sim.run(text(words), data and text(data), handler and text(handler), db)
+    return sim.out
+
+
+def regs(out):
+    return [(pc, r, v) for pc, kind, r, v in out if kind == KIND_REG]
+
+
+@pytest.mark.parametrize('db', [False, True])
+def test_taken_branch_runs_the_delay_slot_only_with_db(db):
+    out = run([ori(8, 0, 1), beq(0, 0, 2), ori(9, 0, 2), ori(10, 0, 3), ori(11, 0, 4)], db)
+    assert [r for _, r, _ in regs(out)] == ([8, 9, 11] if db else [8, 11])
+
+
+@pytest.mark.parametrize('db', [False, True])
+def test_links_past_the_delay_slot_only_with_db(db):
+    link = 0x3008 if db else 0x3004
+    assert regs(run([jal(0x3008), NOP, NOP], db))[0] == (0x3000, 31, link)
+    # jalr $ra, $8
+    assert regs(run([ori(8, 0, 0x300c), r_type(9, rd=31, rs=8), NOP, NOP], db))[1] == (0x3004, 31, link + 4)
+    # bgezal $0 is always taken, bltzal $0 never, and both link
+    assert regs(run([i_type(1, 17, 0, 1), NOP, NOP], db))[0] == (0x3000, 31, link)
+    assert regs(run([i_type(1, 16, 0, 1), NOP, NOP], db))[0] == (0x3000, 31, link)
+
+
+def test_loads_extend_sign_or_zero():
+    loads = [(32, 0), (32, 1), (32, 2), (36, 2), (33, 2), (37, 2), (33, 0), (35, 0)]
+    out = run([i_type(op, 8, 0, addr) for op, addr in loads], data=[0x80ff7f01])
+    assert [v for _, _, v in regs(out)] == [0x01, 0x7f, 0xffffffff, 0xff, 0xffff80ff, 0x80ff, 0x7f01, 0x80ff7f01]
+
+
+def test_partial_stores_merge_into_the_word():
+    out = run([lui(8, 0x1122), ori(8, 8, 0x3344), ori(9, 0, 0xaabb),
+               i_type(43, 8, 0, 4),  # sw $8, 4
+               i_type(40, 9, 0, 5),  # sb $9, 5
+               i_type(41, 9, 0, 6),  # sh $9, 6
+               i_type(41, 9, 0, 8)])  # sh $9, 8 into an empty word
+    assert [(addr, v) for _, kind, addr, v in out if kind == KIND_MEM] == [
+        (4, 0x11223344), (4, 0x1122bb44), (4, 0xaabbbb44), (8, 0xaabb)]
+
+
+def test_mult_and_div():
+    minus_seven = [lui(8, 0xffff), ori(8, 8, 0xfff9), ori(9, 0, 2)]
+    mfhi, mflo = r_type(16, rd=10), r_type(18, rd=11)
+    results = {}
+    for name, fn in (('mult', 24), ('multu', 25), ('div', 26), ('divu', 27)):
+        out = regs(run(minus_seven + [r_type(fn, rs=8, rt=9), mfhi, mflo]))
+        results[name] = out[-2][2], out[-1][2]
+    assert results == {
+        'mult': (0xffffffff, 0xfffffff2),
+        'multu': (1, 0xfffffff2),
+        'div': (0xffffffff, 0xfffffffd),  # remainder takes the sign of the dividend
+        'divu': (1, 0x7ffffffc),
+    }
+    # division by zero leaves hi and lo alone
+    out = regs(run([ori(8, 0, 7), r_type(17, rs=8), r_type(26, rs=8, rt=0), mfhi]))
+    assert out[-1][2] == 7
+    # mul writes the low word of the product to rd
+    assert regs(run(minus_seven + [28 << 26 | 8 << 21 | 9 << 16 | 12 << 11 | 2]))[-1][2] == 0xfffffff2
+
+
+# skips the faulting instruction, recording EPC and Cause in $26 and $27
+HANDLER = [mfc0(26, 14), mfc0(27, 13), i_type(9, 26, 26, 4), mtc0(26, 14), ERET]
+
+
+def test_overflow_traps_into_the_handler():
+    out = run([lui(8, 0x7fff), ori(8, 8, 0xffff),
+               i_type(8, 9, 8, 1),  # addi $9, $8, 1 overflows
+               r_type(32, rd=10, rs=8, rt=8),  # add overflows too
+               r_type(33, rd=11, rs=8, rt=8),  # addu wraps
+               ori(12, 0, 5)], handler=HANDLER)
+    assert [(pc, r, v) for pc, r, v in regs(out) if r != 26] == [
+        (0x3000, 8, 0x7fff0000), (0x3004, 8, 0x7fffffff),
+        (0x4184, 27, EXC_OV << 2), (0x4184, 27, EXC_OV << 2),
+        (0x3010, 11, 0xfffffffe), (0x3014, 12, 5)]
+    assert [v for _, r, v in regs(out) if r == 26] == [0x3008, 0x300c, 0x300c, 0x3010]
+
+
+def test_exception_in_a_delay_slot():
+    out = run([lui(8, 0x7fff), ori(8, 8, 0xffff), beq(0, 0, 2), i_type(8, 9, 8, 1), NOP, ori(10, 0, 1)],
+              db=True, handler=[mfc0(26, 14), mfc0(27, 13), ori(8, 0, 0), ERET])
+    # EPC is the branch, the cause has BD set, and eret reruns the branch with the slot
+    assert regs(out)[2:] == [
+        (0x4180, 26, 0x3008), (0x4184, 27, 0x80000000 | EXC_OV << 2), (0x4188, 8, 0),
+        (0x300c, 9, 1), (0x3014, 10, 1)]
+    with pytest.raises(SimulationError):
+        run([lui(8, 0x7fff), ori(8, 8, 0xffff), i_type(8, 9, 8, 1)])
+
+
+def test_step_limit(tmp_path, capsys):
+    loop = [beq(0, 0, 0xffff), NOP]
+    out_path = str(tmp_path / 'out.txt')
+    assert not Simulator(max_steps=100).run(text(loop))
+    Simulator(max_steps=100)(text(loop), out_path)
+    assert capsys.readouterr().out.startswith('Permitted: Simulator exceeded 100 steps')
+    with pytest.raises(RuntimeError):
+        Simulator(max_steps=100, permit_timeout=False)(text(loop), out_path)
+
+
+def test_answer_key_covers_the_handler_of_the_reference(tmp_path):
+    asm_path = str(tmp_path / 'a.asm')
+    with open(asm_path, 'w', encoding='utf-8') as fp:
+        fp.write('nop\n')
+    mars, sim = FakeMars(), Simulator()
+    assert AnswerCache.key(mars, asm_path, sim, 'a') != AnswerCache.key(mars, asm_path, sim, 'b')
+    assert AnswerCache.key(mars, asm_path, sim, 'a') != AnswerCache.key(mars, asm_path, sim)
+    # MARS runs the handler in the case itself
+    assert AnswerCache.key(mars, asm_path, None, 'a') == AnswerCache.key(mars, asm_path, None, 'b')
@@ -0,0 +1,17 @@
+import os
+
+from judge.staging import retain
+
+
+def test_retain_removes_the_oldest_beyond_max_bytes(tmp_path):
+    for i, name in enumerate(['10', '11', '12']):
+        d = tmp_path / name
+        d.mkdir()
+        (d / 'out.txt').write_bytes(b'x' * 100)
+        os.utime(str(d), (1000 + i, 1000 + i))
+    (tmp_path / 'answers').mkdir()  # not a judge directory
+    assert retain(str(tmp_path), max_bytes=250) == 1
+    assert sorted(os.listdir(str(tmp_path))) == ['11', '12', 'answers']
+    assert retain(str(tmp_path)) == 0
+    assert retain(str(tmp_path), max_age=60) == 2
+    assert os.listdir(str(tmp_path)) == ['answers']
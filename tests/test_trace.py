@@ -0,0 +1,59 @@
+import sys
+
+import pytest
+
+from judge.base import BaseHexRunner
+from judge.diff import Diff, InconsistentResults
+from judge.mars import Mars
+from judge.trace import Trace, first_mismatch
+
+
+# prints the given lines from a child process, through the same output path as the real runners
+class EchoRunner(BaseHexRunner):
+    parse = staticmethod(Mars.parse)
+
+    def __init__(self, lines, **kw):
+        super().__init__(**kw)
+        self.lines = lines
+
+    def run(self, out_path):
+        self._communicate([sys.executable, '-c', 'print({!r})'.format('\n'.join(self.lines))], out_path)
+
+
+def trace_of(lines):
+    r = Trace()
+    r.write('\n'.join(lines))
+    return r
+
+
+def test_empty_sink_receives_records():
+    out = Trace()
+    EchoRunner(['@00003000: $ 8 <= 00000001', '@00003004: *00000000 <= 00000001'])(out)
+    assert len(out) == 2
+    assert list(out.lines()) == ['@00003000: $ 8 <= 00000001', '@00003004: *00000000 <= 00000001']
+
+
+def test_mismatching_compact_trace_fails(tmp_path):
+    out = Trace(str(tmp_path / 'a.out'))
+    ans = Trace(str(tmp_path / 'a.ans'))
+    # both filled by runners, so that sinks left empty would compare equal
+    EchoRunner(['@00003000: $ 8 <= 00000001'])(out)
+    EchoRunner(['@00003000: $ 8 <= 00000002'])(ans)
+    with pytest.raises(InconsistentResults):
+        Diff(compact=True)(out, ans)
+
+
+def test_matching_compact_trace_passes():
+    lines = ['@00003000: $ 8 <= 00000001', '@00003004: $ 9 <= 00000002']
+    out = Trace()
+    EchoRunner(lines)(out)
+    Diff(compact=True)(out, trace_of(lines))
+
+
+def test_first_mismatch():
+    a = trace_of(['@00003000: $ 8 <= 00000001', '@00003004: $ 9 <= 00000002'])
+    b = trace_of(['@00003000: $ 8 <= 00000001', '@00003004: $ 9 <= 00000003'])
+    assert first_mismatch(a, a.copy()) is None
+    assert first_mismatch(a, b) == 1
+    assert first_mismatch(a, trace_of(['@00003000: $ 8 <= 00000001'])) == 1
+    assert first_mismatch(a, trace_of(['@00003000: $ 8 <= 00000001']), permit_prefix=True) is None
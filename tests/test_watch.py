@@ -0,0 +1,60 @@
+import os
+
+from judge.watch import Watcher, watch
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as fp:
+        fp.write(text)
+
+
+def test_poll_reports_added_changed_and_removed_cases(tmp_path):
+    cases = tmp_path / 'cases'
+    cases.mkdir()
+    write(str(cases / 'a.asm'), 'nop\n')
+    write(str(cases / 'b.asm'), 'nop\n')
+    watcher = Watcher(str(cases), ('*.asm',))
+    assert watcher.poll() == set()
+    write(str(cases / 'b.asm'), 'nop\nnop\n')
+    write(str(cases / 'c.asm'), 'nop\n')
+    write(str(cases / 'notes.txt'), 'not a case\n')
+    os.remove(str(cases / 'a.asm'))
+    assert watcher.poll() == {str(cases / name) for name in ('a.asm', 'b.asm', 'c.asm')}
+    assert watcher.poll() == set()
+
+
+# fails c.asm in the first round, then edits b.asm; interrupts the second round
+class ScriptedJudge:
+    cache = None
+
+    def __init__(self, cases):
+        self.cases = cases
+        self.rounds = []
+        self.stopped = False
+
+    def all(self, paths, on_success=None, on_error=None, **kw):
+        self.rounds.append((list(paths), kw))
+        if len(self.rounds) > 1:
+            raise KeyboardInterrupt
+        for path in paths:
+            (on_error if path.endswith('c.asm') else on_success)(path)
+        write(os.path.join(self.cases, 'b.asm'), 'nop\nnop\n')
+
+    def stop(self):
+        self.stopped = True
+
+
+def test_watch_puts_failed_and_changed_cases_first(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    os.mkdir('cases')
+    for name in ('a.asm', 'b.asm', 'c.asm', 'd.asm'):
+        write(os.path.join('cases', name), 'nop\n')
+    judge = ScriptedJudge('cases')
+    watch(judge, 'cases', 'src', interval=0.01, journal='journal.jsonl', resume=True, progress='json')
+    assert judge.stopped
+    (first, first_kw), (second, second_kw) = judge.rounds
+    assert sorted(os.path.basename(p) for p in first) == ['a.asm', 'b.asm', 'c.asm', 'd.asm']
+    second = [os.path.basename(p) for p in second]
+    assert second[:2] == ['c.asm', 'b.asm'] and sorted(second[2:]) == ['a.asm', 'd.asm']
+    assert first_kw == {'journal': 'journal.jsonl', 'resume': True, 'progress': 'json'}
+    assert second_kw['resume'] is False